@@ -1,45 +1,171 @@
-from flask import Flask, request, jsonify, session
-from flask_session import Session
+from startup_report import StartupReport
+# Created before the other imports so the report covers them
+startup = StartupReport()
+
+from flask import Flask, Response, request, jsonify, session
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
-import random
-import pandas as pd
-import mysql.connector
 import json
-from stable_baselines3 import DQN
 from werkzeug.security import check_password_hash
 from werkzeug.security import generate_password_hash
+from question_bank import AskedBitmap
+from model_registry import ModelRegistry
+from storage import QuizRepository, backend_from_env
+from session_store import session_interface_from_env
+from write_behind import WriteBehindBuffer
+from policy_server import PolicyServer
+from quiz_plan import PolicyRankings, build_plan
+import instrumentation
+from instrumentation import metrics, span, MetricsMiddleware, TimedJSONProvider
+import atexit
+import queue
+from concurrent.futures import ThreadPoolExecutor
+startup.mark("imports")
 # Load environment variables
 load_dotenv()
+# Request timing and /metrics (METRICS=1, SLOW_REQUEST_MS=N)
+instrumentation.configure_from_env()
 
 # Flask app setup
 app = Flask(__name__)
-app.config["SESSION_TYPE"] = "filesystem"
 app.config["SECRET_KEY"] = "supersecretkey"
 app.config["SESSION_PERMANENT"] = False
-Session(app)
+app.json = TimedJSONProvider(app)
+app.wsgi_app = MetricsMiddleware(app.wsgi_app)
+# Server-side sessions (SESSION_BACKEND=lru|sqlite, see session_store.py)
+app.session_interface = session_interface_from_env()
 
 # Allow frontend access
 CORS(app, origins=["http://localhost:3000"], supports_credentials=True)
-
-# Load data/model if available
-dataset_path = "QuizBackend/data/preprocessed_dataset.csv"
-model_path = "QuizBackend/data/quiz_model.zip"
-dataset = pd.read_csv(dataset_path) if os.path.exists(dataset_path) else pd.DataFrame()
-model = DQN.load(model_path) if os.path.exists(model_path) else None
+startup.mark("app")
+
+# Question selection: QUESTION_POLICY=heuristic (difficulty matching) or dqn
+# (Q-values from the trained model, micro-batched across requests)
+question_policy = os.getenv("QUESTION_POLICY", "heuristic")
+
+# Model and question bank, reloaded in the background when the files change.
+# The exported question_bank.qbank (see bank_file.py) is mapped, and rebuilt
+# from preprocessed_dataset.csv whenever the CSV is newer, so replacing the CSV
+# still changes what is served. The model (and torch with it) only loads, off
+# the startup path, in dqn mode.
+default_bank_path = "QuizBackend/data/question_bank.qbank"
+default_source_path = "QuizBackend/data/preprocessed_dataset.csv"
+dataset_path = os.getenv("QUIZ_DATASET_PATH")
+registry = ModelRegistry(
+    os.getenv("QUIZ_MODEL_PATH", "QuizBackend/data/quiz_model.zip"),
+    dataset_path or default_bank_path,
+    poll_interval=float(os.getenv("MODEL_RELOAD_INTERVAL", 5)),
+    load_model=question_policy == "dqn",
+    source_path=None if dataset_path else default_source_path,
+)
+registry.start()
+atexit.register(registry.close)
+startup.mark("question_bank")
 
 # Constants
 MIN_QUESTIONS = 10
-
-# Database connection helper
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        database=os.getenv('DB_NAME')
+MAX_PLAN_LENGTH = 50
+HISTORY_STREAM_BATCH = 50
+
+# Persistence (DB_BACKEND=mysql|sqlite, pool size etc. come from .env)
+repository = QuizRepository(
+    backend_from_env(),
+    leaderboard_refresh=float(os.getenv("LEADERBOARD_REFRESH", 5)),
+    video_refresh=float(os.getenv("VIDEO_CACHE_TTL", 300)),
+)
+startup.mark("database")
+
+# Optional write-behind for per-answer persistence (WRITE_BEHIND=1)
+write_buffer = None
+if os.getenv("WRITE_BEHIND") == "1":
+    write_buffer = WriteBehindBuffer(
+        repository.apply_quiz_writes,
+        max_pending=int(os.getenv("WRITE_BEHIND_MAX_PENDING", 1000)),
+        batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", 100)),
+        flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", 0.05)),
+        put_timeout=float(os.getenv("WRITE_BEHIND_PUT_TIMEOUT", 2.0)),
+        flush_timeout=float(os.getenv("WRITE_BEHIND_FLUSH_TIMEOUT", 5.0)),
     )
+    atexit.register(write_buffer.close)
+
+# Micro-batched Q-value inference for QUESTION_POLICY=dqn
+policy_server = None
+if question_policy == "dqn":
+    policy_server = PolicyServer(
+        max_batch=int(os.getenv("POLICY_MAX_BATCH", 32)),
+        max_wait=float(os.getenv("POLICY_MAX_WAIT_MS", 2)) / 1000,
+    )
+    atexit.register(policy_server.close)
+# Q-value rankings behind /api/quiz_plan, cached per model version
+policy_rankings = PolicyRankings() if policy_server is not None else None
+
+# /api/answer_and_next runs the answer's DB write here while it picks the
+# next question (write-through mode; write-behind already returns at once)
+answer_writer = None
+if write_buffer is None:
+    answer_writer = ThreadPoolExecutor(max_workers=int(os.getenv("ANSWER_WRITE_THREADS", 8)),
+                                       thread_name_prefix="answer-write")
+    atexit.register(answer_writer.shutdown)
+startup.mark("workers")
+
+def runtime_gauges():
+    pool = repository.pool.stats()
+    gauges = [
+        ("quiz_db_pool_connections", "Database pool size and idle connections.", {"state": "size"}, pool["size"]),
+        ("quiz_db_pool_connections", "Database pool size and idle connections.", {"state": "idle"}, pool["idle"]),
+    ]
+    if write_buffer is not None:
+        buffered = write_buffer.stats()
+        gauges.append(("quiz_write_behind_pending", "Writes waiting in the write-behind queue.", {}, buffered["pending"]))
+        # Acknowledged answers that never reached the database; alert on any increase
+        gauges.append(("quiz_write_behind_dropped", "Writes dropped after every flush retry failed, since start.", {},
+                       buffered["dropped"]))
+    if policy_server is not None:
+        gauges.append(("quiz_policy_avg_batch", "Mean policy inference batch size.", {}, policy_server.stats()["avg_batch"]))
+    gauges.append(("quiz_video_catalog_size", "Videos held in the VideoResources cache.", {}, len(repository.video_catalog)))
+    active = registry.status()["active"]
+    gauges.append(("quiz_model_version", "Active model and bank versions.", {"part": "model"}, active["model_version"]))
+    gauges.append(("quiz_model_version", "Active model and bank versions.", {"part": "bank"}, active["bank_version"]))
+    return gauges
+
+metrics.register_gauges(runtime_gauges)
+
+@app.before_request
+def label_request_metrics():
+    if metrics.enabled:
+        metrics.set_route(request.url_rule.rule if request.url_rule else None)
+
+# Make the buffered writes submitted so far visible before reading or deleting
+# quiz rows. The buffer is per process, so this covers writes made through
+# this worker only (see serve.py). Only those writes are waited for, up to
+# WRITE_BEHIND_FLUSH_TIMEOUT seconds. Past that, reads go ahead on what is
+# committed (possibly without the newest answers), while deletes and direct
+# writes (strict) fail rather than have older buffered writes land after them.
+def flush_pending_writes(strict=False):
+    if write_buffer is None or write_buffer.flush():
+        return
+    if strict:
+        raise TimeoutError("Earlier answers are still being saved, please retry")
+    print("Write-behind flush timed out; reading without the newest writes")
+
+# Question ids in the session are rows of the bank the quiz started on; after
+# a bank swap they are carried over to the new bank by question text
+def session_questions(snapshot):
+    questions_asked = session.get("questions_asked", [])
+    bank_version = session.get("bank_version", snapshot.bank_version)
+    if bank_version != snapshot.bank_version:
+        questions_asked = registry.translate(questions_asked, bank_version, snapshot.bank)
+        session["questions_asked"] = questions_asked
+        session["bank_version"] = snapshot.bank_version
+        session.modified = True
+    return questions_asked
+
+def require_admin():
+    # ADMIN_TOKEN, when set, must be sent as the X-Admin-Token header
+    token = os.getenv("ADMIN_TOKEN")
+    if token and request.headers.get("X-Admin-Token") != token:
+        raise PermissionError("Admin token required.")
 
 # Session user check
 def get_logged_in_user_id():
@@ -58,11 +184,7 @@ def login():
     if not username or not password:
         return jsonify({"error": "Username and password are required"}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM users WHERE user_name = %s", (username,))
-    user = cursor.fetchone()
-    conn.close()
+    user = repository.get_user_by_name(username)
 
     if user and check_password_hash(user["password"], password):
         session.clear()  # Clean any old session
@@ -86,23 +208,17 @@ def start_quiz():
     except PermissionError as e:
         return jsonify({"error": str(e)}), 401
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Clean video track data for this user
-    cursor.execute("DELETE FROM VideoTrack WHERE user_id = %s", (user_id,))
-
     # Create new quiz entry
     initial_knowledge = 0.5
     initial_score = 0
-    attempt_id = 1  # You might want to calculate this dynamically later
-    cursor.execute(
-        "INSERT INTO Quiz (user_id, knowledge_level, score, weakareas, attempt_id) VALUES (%s, %s, %s, %s, %s)",
-        (user_id, initial_knowledge, initial_score, json.dumps({}), attempt_id)
-    )
-    quiz_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+
+    try:
+        quiz_id, attempt_id = repository.start_quiz(user_id, initial_knowledge, initial_score)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+
+    with registry.acquire() as snapshot:
+        bank_version = snapshot.bank_version
 
     # Store quiz session state
     session.update({
@@ -111,7 +227,8 @@ def start_quiz():
         "score": initial_score,
         "questions_asked": [],
         "weak_areas": {},
-        "attempt_id": attempt_id
+        "attempt_id": attempt_id,
+        "bank_version": bank_version
     })
 
     return jsonify({
@@ -133,27 +250,10 @@ def register():
     hashed_password = generate_password_hash(password)
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Check if username already exists
-        cursor.execute("SELECT * FROM users WHERE user_name = %s", (username,))
-        if cursor.fetchone():
+        next_user_id = repository.create_user(username, hashed_password)
+        if next_user_id is None:
             return jsonify({"error": "Username already taken"}), 409
 
-        # ✅ Get the max user_id and increment it
-        cursor.execute("SELECT MAX(user_id) FROM users")
-        result = cursor.fetchone()
-        next_user_id = (result[0] or 0) + 1  # if None, start at 1
-
-        # Insert with manual user_id
-        cursor.execute(
-            "INSERT INTO users (user_id, user_name, password) VALUES (%s, %s, %s)",
-            (next_user_id, username, hashed_password)
-        )
-        conn.commit()
-        conn.close()
-
         return jsonify({"message": "User registered successfully", "user_id": next_user_id}), 201
 
     except Exception as e:
@@ -163,38 +263,20 @@ def register():
 
 @app.route("/api/leaderboard", methods=["GET"])
 def leaderboard():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    # Optional paging: ?limit=K for the top K, plus ?offset=N for later pages
+    offset = request.args.get("offset", default=0, type=int)
+    limit = request.args.get("limit", type=int)
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({"error": "offset and limit must be non-negative"}), 400
 
     # ✅ Return the best scoring attempt per user
-    cursor.execute("""
-        SELECT 
-            u.user_id,
-            u.user_name,
-            q.quiz_id,
-            q.attempt_id,
-            q.score,
-            q.knowledge_level,
-            q.weakareas
-        FROM users u
-        LEFT JOIN (
-            SELECT *
-            FROM Quiz q1
-            WHERE (user_id, score) IN (
-                SELECT user_id, MAX(score)
-                FROM Quiz
-                GROUP BY user_id
-            )
-        ) q ON u.user_id = q.user_id
-        ORDER BY q.score DESC;
-    """)
-
-    data = cursor.fetchall()
-    conn.close()
+    total, data = repository.leaderboard(offset, limit)
 
     return jsonify({
         "status": "success",
-        "total": len(data),
+        "total": total,
+        "offset": offset,
+        "limit": limit,
         "leaderboard": data
     })
 
@@ -202,22 +284,8 @@ def leaderboard():
 @app.route("/api/clear_all_data", methods=["POST"])
 def clear_all_data():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Delete all quiz-related data first (respect FK constraints)
-        cursor.execute("DELETE FROM VideoTrack")
-        cursor.execute("DELETE FROM Question")
-        cursor.execute("DELETE FROM Quiz")
-
-        # Optional: Delete from VideoResources
-        # cursor.execute("DELETE FROM VideoResources")
-
-        # Delete users (last, due to FK)
-        cursor.execute("DELETE FROM users")
-
-        conn.commit()
-        conn.close()
+        flush_pending_writes(strict=True)
+        repository.clear_all_data()
 
         return jsonify({
             "status": "success",
@@ -230,46 +298,131 @@ def clear_all_data():
             "message": f"Failed to clear data: {str(e)}"
         }), 500
 
+# Picks the next question for a session at `knowledge_level`: the DQN's choice
+# when that policy is on, otherwise any question first, then one near the
+# learner's level
+def select_next_question(snapshot, knowledge_level, questions_asked):
+    if policy_server is not None and snapshot.model is not None:
+        try:
+            selected_id = policy_server.select(snapshot.model, knowledge_level, questions_asked, len(snapshot.bank))
+            if selected_id is not None:
+                return selected_id
+        except Exception as e:
+            print("Policy selection failed, using heuristic:", e)
+
+    with span("bank"):
+        asked = AskedBitmap(questions_asked)
+        if len(questions_asked) == 0:
+            return snapshot.bank.sample_any(asked)
+        return snapshot.bank.pick(knowledge_level * 3, asked, k=5)
+
+def question_payload(snapshot, selected_id):
+    with span("bank"):
+        selected_question = snapshot.bank.row(selected_id)
+        correct_answer = selected_question["Correct Answer"]
+        options = snapshot.distractors.options(correct_answer, k=3, category=selected_question["Category"])
+    return {
+        "question_id": selected_id,
+        "question": selected_question["Question"],
+        "options": options,
+        "correct_answer": correct_answer
+    }
+
 # Next question
 @app.route("/api/next_question", methods=["GET"])
 def next_question():
     if "quiz_id" not in session:
         return jsonify({"error": "Start the quiz first!"}), 400
 
-    questions_asked = session.get("questions_asked", [])
-
-    if len(questions_asked) >= MIN_QUESTIONS:
+    if len(session.get("questions_asked", [])) >= MIN_QUESTIONS:
         return jsonify({"message": "Quiz completed!", "results": save_quiz_results()}), 200
 
-    available_questions = dataset[~dataset.index.isin(questions_asked)].copy()
-
-    if available_questions.empty:
-        return jsonify({"message": "No more available questions!"}), 200
+    with registry.acquire() as snapshot:
+        questions_asked = session_questions(snapshot)
+        selected_id = select_next_question(snapshot, session["knowledge_level"], questions_asked)
+        if selected_id is None:
+            return jsonify({"message": "No more available questions!"}), 200
+
+        payload = question_payload(snapshot, selected_id)
+        session["questions_asked"] = questions_asked + [selected_id]
+        session.modified = True
+
+    return jsonify(payload)
+
+# session_questions for grading the session's last question: raises
+# LookupError, before translating anything, if a bank swap removed it
+def answered_questions(snapshot):
+    if session.get("bank_version", snapshot.bank_version) != snapshot.bank_version:
+        # The bank was replaced since this question was served
+        old_bank = registry.bank(session["bank_version"])
+        question_id = session["questions_asked"][-1]
+        if old_bank is None or question_id >= len(old_bank) or snapshot.bank.find(old_bank.questions[question_id]) is None:
+            raise LookupError("This question is no longer available, please fetch the next one.")
+    return session_questions(snapshot)
+
+# Grades the answer to questions_asked[-1] (ids in the snapshot's bank, see
+# answered_questions) without touching the session
+def grade_answer(snapshot, questions_asked, user_answer):
+    question_data = snapshot.bank.row(questions_asked[-1])
+    correct_answer = question_data["Correct Answer"]
+    is_correct = user_answer == correct_answer
+    difficulty = int(question_data["Difficulty"])
 
-    if len(questions_asked) == 0:
-        selected_question = available_questions.sample(1).iloc[0]
+    if is_correct:
+        score = session["score"] + difficulty
+        knowledge_level = min(1.0, session["knowledge_level"] + 0.1)
     else:
-        target_difficulty = session["knowledge_level"] * 3
-        available_questions["diff_delta"] = (available_questions["Difficulty"] - target_difficulty).abs()
-        top_n = available_questions.sort_values("diff_delta").head(5)
-        selected_question = top_n.sample(1).iloc[0]
-
+        score = session["score"] - difficulty * 0.5
+        knowledge_level = max(0.0, session["knowledge_level"] - 0.1)
 
-    session["questions_asked"].append(int(selected_question.name))
-
-    correct_answer = selected_question["Correct Answer"]
-    wrong_answers = dataset[dataset["Correct Answer"] != correct_answer]["Correct Answer"].unique().tolist()
-    wrong_answers = random.sample(wrong_answers, min(len(wrong_answers), 3))
+    return {
+        "question": question_data["Question"],
+        "correct_answer": correct_answer,
+        "is_correct": is_correct,
+        "weak_area": question_data.get("Category", "Unknown"),
+        "score": score,
+        "knowledge_level": knowledge_level
+    }
 
-    options = [correct_answer] + wrong_answers
-    random.shuffle(options)
+# Raises queue.Full when the write-behind buffer stays full
+def persist_answer(user_id, quiz_id, attempt_id, grade):
+    if write_buffer is not None:
+        write_buffer.submit({
+            "kind": "answer",
+            "user_id": user_id,
+            "quiz_id": quiz_id,
+            "attempt_id": attempt_id,
+            "description": grade["question"],
+            "is_correct": grade["is_correct"],
+            "correct_answer": grade["correct_answer"],
+            "weakarea": grade["weak_area"],
+            "score": grade["score"],
+            "knowledge_level": grade["knowledge_level"]
+        })
+    else:
+        repository.record_answer(user_id, quiz_id, attempt_id, grade["question"], grade["is_correct"],
+                                 grade["correct_answer"], grade["weak_area"], grade["score"], grade["knowledge_level"])
+
+# persist_answer on an answer_writer thread, timed into `record` (a
+# metrics.helper_record the request merges once the write is done)
+def persist_answer_for(record, *args):
+    with metrics.attached(record):
+        persist_answer(*args)
+
+# Session state only changes once the write is accepted, so a 503 retry
+# does not count the answer twice
+def apply_grade(grade):
+    session["score"] = grade["score"]
+    session["knowledge_level"] = grade["knowledge_level"]
+    if not grade["is_correct"]:
+        session["weak_areas"][grade["weak_area"]] = session["weak_areas"].get(grade["weak_area"], 0) + 1
+    session.modified = True
 
-    return jsonify({
-        "question_id": int(selected_question.name),
-        "question": selected_question["Question"],
-        "options": options,
-        "correct_answer": correct_answer
-    })
+    return {
+        "correct": grade["is_correct"],
+        "message": "Correct!" if grade["is_correct"] else f"Incorrect! The correct answer was {grade['correct_answer']}",
+        "score": session["score"]
+    }
 
 # Submit answer
 @app.route("/api/submit_answer", methods=["POST"])
@@ -285,52 +438,101 @@ def submit_answer():
     if "questions_asked" not in session or not session["questions_asked"]:
         return jsonify({"error": "No active question found!"}), 400
 
-    last_question_index = session["questions_asked"][-1]
-    question_data = dataset.iloc[last_question_index]
-    correct_answer = question_data["Correct Answer"]
-    is_correct = user_answer == correct_answer
-    difficulty = int(question_data["Difficulty"])
-    attempt_id = session["attempt_id"]
-    weak_area = question_data.get("Category", "Unknown")
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO Question (quiz_id, attempt_id, description, is_correct, correct_answer, weakarea) VALUES (%s, %s, %s, %s, %s, %s)",
-        (session["quiz_id"], attempt_id, question_data["Question"], is_correct, correct_answer, weak_area)
-    )
+    with registry.acquire() as snapshot:
+        try:
+            questions_asked = answered_questions(snapshot)
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 409
+        grade = grade_answer(snapshot, questions_asked, user_answer)
 
-    if is_correct:
-        session["score"] += difficulty
-        session["knowledge_level"] = min(1.0, session["knowledge_level"] + 0.1)
-    else:
-        session["score"] -= difficulty * 0.5
-        session["knowledge_level"] = max(0.0, session["knowledge_level"] - 0.1)
-        session["weak_areas"][weak_area] = session["weak_areas"].get(weak_area, 0) + 1
+    try:
+        persist_answer(user_id, session["quiz_id"], session["attempt_id"], grade)
+    except queue.Full:
+        return jsonify({"error": "Server busy, please retry your answer"}), 503
+
+    return jsonify(apply_grade(grade))
+
+# Submit answer and get the next question in one round trip. The next
+# question depends only on the graded knowledge level, so it is picked while
+# the answer's DB write runs. Responds with {"answer": <submit_answer body>,
+# "next": <next_question body>}; errors are those of submit_answer.
+@app.route("/api/answer_and_next", methods=["POST"])
+def answer_and_next():
+    try:
+        user_id = get_logged_in_user_id()
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 401
 
-    cursor.execute("UPDATE Quiz SET score = %s, knowledge_level = %s WHERE quiz_id = %s",
-                   (session["score"], session["knowledge_level"], session["quiz_id"]))
-    conn.commit()
-    conn.close()
+    data = request.json
+    user_answer = data.get("answer")
 
-    session.modified = True
+    if "questions_asked" not in session or not session["questions_asked"]:
+        return jsonify({"error": "No active question found!"}), 400
 
-    return jsonify({
-        "correct": is_correct,
-        "message": "Correct!" if is_correct else f"Incorrect! The correct answer was {correct_answer}",
-        "score": session["score"]
-    })
+    with registry.acquire() as snapshot:
+        try:
+            questions_asked = answered_questions(snapshot)
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 409
+        grade = grade_answer(snapshot, questions_asked, user_answer)
+
+        write = None
+        if answer_writer is not None:
+            record = metrics.current()
+            write_record = metrics.helper_record(record)
+            write = answer_writer.submit(persist_answer_for, write_record, user_id, session["quiz_id"],
+                                         session["attempt_id"], grade)
+        else:
+            try:
+                persist_answer(user_id, session["quiz_id"], session["attempt_id"], grade)
+            except queue.Full:
+                return jsonify({"error": "Server busy, please retry your answer"}), 503
+
+        finished = len(questions_asked) >= MIN_QUESTIONS
+        selected_id = None
+        try:
+            if not finished:
+                selected_id = select_next_question(snapshot, grade["knowledge_level"], questions_asked)
+                if selected_id is not None:
+                    payload = question_payload(snapshot, selected_id)
+        finally:
+            if write is not None:
+                try:
+                    # A failed write fails the request before the session changes
+                    write.result()
+                finally:
+                    metrics.merge(record, write_record)
+
+    answer = apply_grade(grade)
+    if finished:
+        next_body = {"message": "Quiz completed!", "results": save_quiz_results()}
+    elif selected_id is None:
+        next_body = {"message": "No more available questions!"}
+    else:
+        session["questions_asked"] = questions_asked + [selected_id]
+        next_body = payload
+    return jsonify({"answer": answer, "next": next_body})
 
 # Save quiz results
 def save_quiz_results():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    weakareas_json = json.dumps(session.get("weak_areas", {}))
-
-    cursor.execute("UPDATE Quiz SET knowledge_level = %s, score = %s, weakareas = %s WHERE quiz_id = %s",
-                   (session["knowledge_level"], session["score"], weakareas_json, session["quiz_id"]))
-    conn.commit()
-    conn.close()
+    if write_buffer is not None:
+        # Queued behind this quiz's answers so it is never overwritten by them
+        try:
+            write_buffer.submit({
+                "kind": "results",
+                "user_id": session.get("user_id"),
+                "quiz_id": session["quiz_id"],
+                "score": session["score"],
+                "knowledge_level": session["knowledge_level"],
+                "weakareas": session.get("weak_areas", {})
+            })
+        except queue.Full:
+            flush_pending_writes(strict=True)
+            repository.save_quiz_results(session.get("user_id"), session["quiz_id"], session["knowledge_level"],
+                                         session["score"], session.get("weak_areas", {}))
+    else:
+        repository.save_quiz_results(session.get("user_id"), session["quiz_id"], session["knowledge_level"], session["score"],
+                                     session.get("weak_areas", {}))
 
     return {
         "quiz_id": session["quiz_id"],
@@ -350,38 +552,120 @@ def quiz_results():
 
 @app.route("/api/reset_data", methods=["POST"])
 def reset_data():
-    global model
-
     try:
         user_id = get_logged_in_user_id()
     except PermissionError as e:
         return jsonify({"error": str(e)}), 401
 
-    model_path = "QuizBackend/data/quiz_model.zip"
-    model = DQN.load(model_path) if os.path.exists(model_path) else None
+    # The model itself is kept current by the registry, never loaded here
+    model_loaded = os.path.exists(registry.model_path)
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
         # 🧹 Only delete this user's data
-        cursor.execute("DELETE FROM VideoTrack WHERE user_id = %s", (user_id,))
-        cursor.execute("DELETE FROM Question WHERE quiz_id IN (SELECT quiz_id FROM Quiz WHERE user_id = %s)", (user_id,))
-        cursor.execute("DELETE FROM Quiz WHERE user_id = %s", (user_id,))
-        
-        conn.commit()
-        conn.close()
+        flush_pending_writes(strict=True)
+        repository.delete_user_data(user_id)
 
         return jsonify({
             "message": "Your quiz data and model session have been reset.",
-            "model_status": "Model reset successfully." if model else "Model file not found. Reset failed."
+            "model_status": "Model reset successfully." if model_loaded else "Model file not found. Reset failed."
         })
 
     except Exception as e:
         return jsonify({"error": f"Error resetting data: {str(e)}"}), 500
 
+# Prometheus text exposition of the request, span and pool metrics
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# Startup phase timings and the load times of the active model and bank
+@app.route("/api/admin/startup", methods=["GET"])
+def startup_status():
+    try:
+        require_admin()
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 403
+
+    report = startup.as_dict()
+    report["registry"] = registry.status()["active"]
+    return jsonify(report)
+
+# Active and retiring model/bank versions
+@app.route("/api/admin/model", methods=["GET"])
+def model_status():
+    try:
+        require_admin()
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 403
+
+    return jsonify(registry.status())
+
+# Check the model and dataset files now; the swap happens in the background
+@app.route("/api/admin/model/reload", methods=["POST"])
+def reload_model():
+    try:
+        require_admin()
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 403
+
+    registry.request_reload()
+    return jsonify({"message": "Reload requested.", "status": registry.status()}), 202
+
+# Drop the cached VideoResources rows after editing the table; the next
+# weak-areas request reloads them
+@app.route("/api/admin/videos/reload", methods=["POST"])
+def reload_videos():
+    try:
+        require_admin()
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 403
+
+    repository.video_catalog.invalidate()
+    return jsonify({"message": "Video cache invalidated.", "status": repository.video_catalog.stats()})
+
+
+def history_record(quiz, questions):
+    weak_areas = json.loads(quiz["weakareas"]) if quiz["weakareas"] else {}
+
+    correct_answers = [q["description"] for q in questions if q["is_correct"]]
+    incorrect_answers = [{"question": q["description"], "correct_answer": q["correct_answer"]} for q in questions if not q["is_correct"]]
+
+    return {
+        "quiz_id": quiz["quiz_id"],
+        "attempt_id": quiz["attempt_id"],
+        "total_questions": len(questions),
+        "final_score": quiz["score"],
+        "final_knowledge_level": quiz["knowledge_level"],
+        "weak_areas": weak_areas,
+        "correct_answers": correct_answers,
+        "incorrect_answers": incorrect_answers
+    }
+
+def stream_history(user_id, before, limit):
+    # Yields the same {"history": [...], "next_cursor": ...} document as the
+    # paged response, a batch of quizzes at a time
+    yield '{"history": ['
+    sent = 0
+    next_cursor = None
+    while limit is None or sent < limit:
+        batch_size = HISTORY_STREAM_BATCH if limit is None else min(HISTORY_STREAM_BATCH, limit - sent)
+        last_batch = limit is not None and sent + batch_size == limit
+        # On the last batch one extra row tells us whether another page exists
+        batch = repository.quiz_history(user_id, before, batch_size + 1 if last_batch else batch_size)
+        if last_batch and len(batch) > batch_size:
+            batch = batch[:batch_size]
+            next_cursor = batch[-1][0]["quiz_id"] if batch else None
+        for quiz, questions in batch:
+            yield (", " if sent else "") + app.json.dumps(history_record(quiz, questions))
+            sent += 1
+        if len(batch) < batch_size:
+            break
+        before = batch[-1][0]["quiz_id"]
+    yield '], "next_cursor": ' + app.json.dumps(next_cursor) + "}"
 
 # Get previous quiz records
+# ?limit=N pages newest first; pass the returned next_cursor as ?before= for
+# the next page. ?stream=1 streams the history instead of building it in memory.
 @app.route("/api/previous_records", methods=["GET"])
 def previous_records():
     try:
@@ -389,33 +673,24 @@ def previous_records():
     except PermissionError as e:
         return jsonify({"error": str(e)}), 401
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM Quiz WHERE user_id = %s ORDER BY quiz_id DESC", (user_id,))
-    quizzes = cursor.fetchall()
-
-    records = []
-    for quiz in quizzes:
-        cursor.execute("SELECT * FROM Question WHERE quiz_id = %s", (quiz["quiz_id"],))
-        questions = cursor.fetchall()
-        weak_areas = json.loads(quiz["weakareas"]) if quiz["weakareas"] else {}
-
-        correct_answers = [q["description"] for q in questions if q["is_correct"]]
-        incorrect_answers = [{"question": q["description"], "correct_answer": q["correct_answer"]} for q in questions if not q["is_correct"]]
-
-        records.append({
-            "quiz_id": quiz["quiz_id"],
-            "attempt_id": quiz["attempt_id"],
-            "total_questions": len(questions),
-            "final_score": quiz["score"],
-            "final_knowledge_level": quiz["knowledge_level"],
-            "weak_areas": weak_areas,
-            "correct_answers": correct_answers,
-            "incorrect_answers": incorrect_answers
-        })
+    limit = request.args.get("limit", type=int)
+    before = request.args.get("before", type=int)
+    if limit is not None and limit < 0:
+        return jsonify({"error": "limit must be non-negative"}), 400
+
+    flush_pending_writes()
+    if request.args.get("stream") == "1":
+        return Response(stream_history(user_id, before, limit), mimetype="application/json")
 
-    conn.close()
-    return jsonify({"history": records})
+    # One extra row tells us whether another page exists
+    history = repository.quiz_history(user_id, before, None if limit is None else limit + 1)
+    next_cursor = None
+    if limit is not None and len(history) > limit:
+        history = history[:limit]
+        next_cursor = history[-1][0]["quiz_id"] if history else None
+
+    records = [history_record(quiz, questions) for quiz, questions in history]
+    return jsonify({"history": records, "next_cursor": next_cursor})
 
 @app.route("/api/weak_areas", methods=["GET"])
 def weak_areas():
@@ -424,43 +699,24 @@ def weak_areas():
     except PermissionError as e:
         return jsonify({"error": str(e)}), 401
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
     # ✅ Get the latest quiz attempt for the user
-    cursor.execute("""
-        SELECT * FROM Quiz 
-        WHERE user_id = %s 
-        ORDER BY attempt_id DESC 
-        LIMIT 1
-    """, (user_id,))
-    latest_quiz = cursor.fetchone()
+    flush_pending_writes()
+    latest_quiz = repository.latest_quiz(user_id)
 
     if not latest_quiz:
-        conn.close()
         return jsonify({"error": "No quiz attempts found for this user!"}), 404
 
     weak_areas = json.loads(latest_quiz["weakareas"]) if latest_quiz["weakareas"] else {}
     video_suggestions = {}
 
-    if weak_areas:
-        placeholders = ', '.join(['%s'] * len(weak_areas))
-        cursor.execute(
-            f"SELECT * FROM VideoResources WHERE weakarea IN ({placeholders})",
-            list(weak_areas.keys())
-        )
-        videos = cursor.fetchall()
-
-        for v in videos:
-            wa = v["weakarea"]
-            video_suggestions.setdefault(wa, []).append({
-                "video_id": v["video_id"],
-                "title": v["video_title"],
-                "url": v["video_url"],
-                "description": v["description"]
-            })
-
-    conn.close()
+    for v in repository.videos_for_weakareas(weak_areas.keys()):
+        wa = v["weakarea"]
+        video_suggestions.setdefault(wa, []).append({
+            "video_id": v["video_id"],
+            "title": v["video_title"],
+            "url": v["video_url"],
+            "description": v["description"]
+        })
 
     return jsonify({
         "quiz_id": latest_quiz["quiz_id"],
@@ -477,42 +733,25 @@ def get_quiz_questions():
     except PermissionError as e:
         return jsonify({"error": str(e)}), 401
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # 🔍 Step 1: Get latest attempt_id for this user
-    cursor.execute("SELECT MAX(attempt_id) AS latest FROM Quiz WHERE user_id = %s", (user_id,))
-    latest_attempt = cursor.fetchone()["latest"]
+    # 🔍 Latest attempt_id for this user and its incorrect questions
+    flush_pending_writes()
+    latest_attempt, questions = repository.incorrect_questions_latest_attempt(user_id)
 
     if not latest_attempt:
-        conn.close()
         return jsonify({"error": "No attempts found for user!"}), 404
 
-    # 🔍 Step 2: Get all incorrect questions from latest attempt
-    cursor.execute("""
-        SELECT description, correct_answer, weakarea, COUNT(*) AS attempt_count 
-        FROM Question 
-        WHERE is_correct = 0 AND quiz_id IN (
-            SELECT quiz_id FROM Quiz WHERE user_id = %s AND attempt_id = %s
-        )
-        GROUP BY description, correct_answer, weakarea
-        ORDER BY attempt_count DESC
-        LIMIT 10;
-    """, (user_id, latest_attempt))
-    questions = cursor.fetchall()
-    conn.close()
-
     if not questions:
         return jsonify({"error": "No incorrect questions found for latest attempt!"}), 404
 
+    # Banks are immutable, so the snapshot's pool stays usable after a swap
+    with registry.acquire() as snapshot:
+        distractor_pool = snapshot.distractors
+
     # 🔄 Step 3: Build fake answers
     result = []
     for question in questions:
         correct_answer = question["correct_answer"]
-        wrong_answers = dataset[dataset["Correct Answer"] != correct_answer]["Correct Answer"].unique().tolist()
-        wrong_answers = random.sample(wrong_answers, min(len(wrong_answers), 3))
-        options = [correct_answer] + wrong_answers
-        random.shuffle(options)
+        options = distractor_pool.options(correct_answer, k=3, category=question["weakarea"])
 
         result.append({
             "question": question["description"],
@@ -528,6 +767,25 @@ def get_quiz_questions():
 
 
 
+# Whole adaptive quiz in one call (see quiz_plan.py for how a client walks
+# it); the answers come back in bulk through /api/submit_quiz_re
+@app.route("/api/quiz_plan", methods=["GET"])
+def quiz_plan():
+    try:
+        get_logged_in_user_id()
+    except PermissionError as e:
+        return jsonify({"error": str(e)}), 401
+
+    length = request.args.get("length", default=MIN_QUESTIONS, type=int)
+    if not 1 <= length <= MAX_PLAN_LENGTH:
+        return jsonify({"error": f"length must be between 1 and {MAX_PLAN_LENGTH}"}), 400
+
+    with registry.acquire() as snapshot:
+        plan = build_plan(snapshot, length, policy_rankings)
+
+    return jsonify({"status": "success", **plan})
+
+
 @app.route("/api/submit_quiz_re", methods=["POST"])
 def submit_quiz():
     try:
@@ -542,33 +800,17 @@ def submit_quiz():
     user_answers = data['answers']
     # ... (same rest of the code but remove user_id references from body and use the session one)
 
+    with registry.acquire() as snapshot:
+        question_bank = snapshot.bank
 
-    # Step 0: Connect to DB
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # Step 0.1: Delete previous video tracking for this user (to reset history for this new quiz)
-    cursor.execute("DELETE FROM VideoTrack WHERE user_id = %s", (user_id,))
-
-    # Step 1: Get the latest attempt_id for the user
-    cursor.execute("SELECT MAX(attempt_id) FROM Quiz WHERE user_id = %s", (user_id,))
-    latest_attempt = cursor.fetchone()[0]
-    attempt_id = (latest_attempt or 0) + 1
-
-    # Step 2: Create a new Quiz entry (temp values for score and weakareas)
-    cursor.execute("""
-        INSERT INTO Quiz (user_id, knowledge_level, score, weakareas, attempt_id)
-        VALUES (%s, %s, %s, %s, %s)
-    """, (user_id, 0, 0, json.dumps({}), attempt_id))
-    quiz_id = cursor.lastrowid
-
-    # Step 3: Initialize tracking
+    # Step 1: Initialize tracking
     correct_answers_count = 0
     total_questions = len(user_answers)
     answers_details = []
+    answer_rows = []
     weakarea_tracker = {}
 
-    # Step 4: Loop through answers
+    # Step 2: Loop through answers
     for ans in user_answers:
         question_desc = ans.get("question")
         user_answer = ans.get("user_answer")
@@ -576,13 +818,13 @@ def submit_quiz():
         if not question_desc or not user_answer:
             continue
 
-        # ✅ Use dataset as ground truth instead of Question table
-        row = dataset[dataset["Question"] == question_desc]
-        if row.empty:
+        # ✅ Use the question bank as ground truth instead of Question table
+        question_id = question_bank.find(question_desc)
+        if question_id is None:
             continue  # skip if question not found
 
-        correct_answer = row.iloc[0]["Correct Answer"]
-        weakarea = row.iloc[0].get("Category", "Unknown")
+        correct_answer = question_bank.answers[question_id]
+        weakarea = question_bank.category_of(question_id)
         is_correct = int(correct_answer == user_answer)
 
         if not is_correct:
@@ -590,12 +832,7 @@ def submit_quiz():
         else:
             correct_answers_count += 1
 
-        # Store answered question into Question table (for logging only)
-        cursor.execute("""
-            INSERT INTO Question (quiz_id, attempt_id, description, correct_answer, is_correct, weakarea)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (quiz_id, attempt_id, question_desc, correct_answer, is_correct, weakarea))
-
+        answer_rows.append((question_desc, correct_answer, is_correct, weakarea))
         answers_details.append({
             "question": question_desc,
             "user_answer": user_answer,
@@ -604,22 +841,16 @@ def submit_quiz():
             "weakarea": weakarea
         })
 
-    # Step 5: Calculate final metrics
+    # Step 3: Calculate final metrics
     score_percentage = (correct_answers_count / total_questions) * 100 if total_questions > 0 else 0
     knowledge_level = correct_answers_count / total_questions if total_questions > 0 else 0.0
-    weakareas_json = json.dumps(weakarea_tracker)
     weakareas_summary = sorted(weakarea_tracker.items(), key=lambda x: x[1], reverse=True)
 
-    # Step 6: Update quiz record
-    cursor.execute("""
-        UPDATE Quiz 
-        SET score = %s, knowledge_level = %s, weakareas = %s 
-        WHERE quiz_id = %s
-    """, (score_percentage, knowledge_level, weakareas_json, quiz_id))
-
-    # Step 7: Commit and return response
-    conn.commit()
-    conn.close()
+    # Step 4: Store the new attempt, its answers and video-track reset in one transaction
+    try:
+        attempt_id = repository.record_retake(user_id, answer_rows, score_percentage, knowledge_level, weakarea_tracker)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
 
     return jsonify({
         "status": "success",
@@ -640,43 +871,21 @@ def get_weak_areas_latest():
     except PermissionError as e:
         return jsonify({"error": str(e)}), 401
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
     # Step 1: Get the latest quiz attempt
-    cursor.execute("""
-        SELECT weakareas, quiz_id, attempt_id 
-        FROM Quiz 
-        WHERE user_id = %s 
-        ORDER BY attempt_id DESC 
-        LIMIT 1
-    """, (user_id,))
-    
-    result = cursor.fetchone()
+    flush_pending_writes()
+    result = repository.latest_quiz(user_id)
     if not result:
-        conn.close()
         return jsonify({"error": "No quiz attempts found for this user!"}), 404
 
     quiz_id = result["quiz_id"]
     weakareas = json.loads(result["weakareas"]) if result["weakareas"] else {}
 
-    # Step 2: Get relevant videos from VideoResources
+    # Step 2: Get relevant videos from the VideoResources cache
     video_suggestions = {}
-    if weakareas:
-        placeholders = ', '.join(['%s'] * len(weakareas))
-        cursor.execute(
-            f"SELECT * FROM VideoResources WHERE weakarea IN ({placeholders})",
-            list(weakareas.keys())
-        )
-        videos = cursor.fetchall()
-
+    videos = repository.videos_for_weakareas(weakareas.keys())
+    if videos:
         # Step 3: Get watched status from VideoTrack
-        cursor.execute("""
-            SELECT video_id, watched FROM VideoTrack
-            WHERE user_id = %s AND quiz_id = %s
-        """, (user_id, quiz_id))
-        watch_data = cursor.fetchall()
-        watched_map = {row["video_id"]: row["watched"] for row in watch_data}
+        watched_map = repository.watched_videos(user_id, quiz_id)
 
         for v in videos:
             wa = v["weakarea"]
@@ -689,8 +898,6 @@ def get_weak_areas_latest():
                 "watched": watched_map.get(vid, False)
             })
 
-    conn.close()
-
     return jsonify({
         "quiz_id": quiz_id,
         "attempt_id": result["attempt_id"],
@@ -714,29 +921,7 @@ def track_video():
     if not all([user_id, video_id, quiz_id]):
         return jsonify({"error": "Missing fields!"}), 400
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # ✅ Use the correct column name: track_id
-    cursor.execute("""
-        SELECT track_id FROM VideoTrack
-        WHERE user_id = %s AND video_id = %s AND quiz_id = %s
-    """, (user_id, video_id, quiz_id))
-    existing = cursor.fetchone()
-
-    if existing:
-        cursor.execute("""
-            UPDATE VideoTrack SET watched = %s, clicked_at = NOW()
-            WHERE track_id = %s
-        """, (watched, existing[0]))  # or existing["track_id"] if using dictionary=True
-    else:
-        cursor.execute("""
-            INSERT INTO VideoTrack (user_id, video_id, quiz_id, watched)
-            VALUES (%s, %s, %s, %s)
-        """, (user_id, video_id, quiz_id, watched))
-
-    conn.commit()
-    conn.close()
+    repository.track_video(user_id, video_id, quiz_id, watched)
 
     return jsonify({"status": "updated", "watched": watched})
 
@@ -747,28 +932,8 @@ def video_history():
     except PermissionError as e:
         return jsonify({"error": str(e)}), 401
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
     # Fetch all video tracking info with video details
-    cursor.execute("""
-        SELECT 
-            vt.quiz_id,
-            vt.video_id,
-            vr.weakarea,
-            vr.video_title,
-            vr.video_url,
-            vr.description,
-            vt.watched,
-            vt.clicked_at
-        FROM VideoTrack vt
-        JOIN VideoResources vr ON vt.video_id = vr.video_id
-        WHERE vt.user_id = %s
-        ORDER BY vt.quiz_id DESC, vt.clicked_at DESC
-    """, (user_id,))
-    
-    rows = cursor.fetchall()
-    conn.close()
+    rows = repository.video_history(user_id)
 
     # Group by quiz_id
     history = {}
@@ -788,5 +953,8 @@ def video_history():
 
     return jsonify({"user_id": user_id, "video_history": history})
 
+startup.ready()
+print(startup.summary())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001, debug=True)
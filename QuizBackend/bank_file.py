@@ -0,0 +1,364 @@
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+
+from question_bank import QuestionBank
+
+# Binary question-bank format (.qbank), written by preprocess.py or
+#   python QuizBackend/bank_file.py [preprocessed_dataset.csv] [question_bank.qbank]
+# and memory-mapped by the API server, so every worker shares one page-cached
+# copy and startup skips CSV parsing. All integers are little-endian; every
+# section starts on an 8-byte boundary:
+#   header     magic, format version, question count, category count, section table
+#   difficulty int8 per question
+#   category   uint16 category code per question
+#   questions / answers / category names
+#              uint32 offsets (count + 1) followed by one UTF-8 blob
+#   text order int32 question ids sorted by (text hash, id) (the find() index)
+#   buckets    (level, category code or -1, start, length) int32 rows over
+#              one int32 id array, i.e. the bank's difficulty and cell buckets
+#   text hash  uint64 hash of each text order entry's question, ascending
+# Version 1 files sorted the text order by question text and had no hash
+# section; they still load.
+
+MAGIC = b"QBNK"
+FORMAT_VERSION = 2
+SECTIONS = (
+    "difficulty", "category",
+    "question_offsets", "question_blob",
+    "answer_offsets", "answer_blob",
+    "category_offsets", "category_blob",
+    "text_order", "bucket_table", "bucket_ids",
+    "text_hash",
+)
+SECTIONS_V1 = SECTIONS[:-1]
+HEADER = struct.Struct("<4sHHII")
+SECTION_ENTRY = struct.Struct("<QQ")
+HEADER_SIZE = HEADER.size + SECTION_ENTRY.size * len(SECTIONS)
+NO_CATEGORY = -1
+COPY_BUFFER = 1 << 20
+# New text hashes the writer keeps in a dict before merging them into its
+# sorted dedupe index
+MERGE_EVERY = 1 << 16
+
+
+def text_hash(raw):
+    # Stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "little")
+
+
+class StringTable:
+    # Read-only sequence of strings decoded on access from an offsets + blob pair
+    __slots__ = ("_offsets", "_blob")
+
+    def __init__(self, offsets, blob):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def raw(self, index):
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]])
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError("string table index out of range")
+        return self.raw(index).decode("utf-8")
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.raw(index).decode("utf-8")
+
+
+class TextIndex:
+    # Binary search over ids sorted by (text, id), the version 1 layout
+    __slots__ = ("_texts", "_order")
+
+    def __init__(self, texts, order):
+        self._texts = texts
+        self._order = order
+
+    def get(self, text, default=None):
+        key = text.encode("utf-8")
+        low, high = 0, len(self._order)
+        while low < high:
+            middle = (low + high) // 2
+            if self._texts.raw(self._order[middle]) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self._order) and self._texts.raw(self._order[low]) == key:
+            return self._order[low]
+        return default
+
+
+class HashedTextIndex:
+    # Binary search over ids sorted by (text hash, id), then an exact text
+    # check; same answers as the dict index a CSV-built bank uses, without a
+    # per-process copy of every question
+    __slots__ = ("_texts", "_order", "_hashes")
+
+    def __init__(self, texts, order, hashes):
+        self._texts = texts
+        self._order = order
+        self._hashes = hashes
+
+    def get(self, text, default=None):
+        key = text.encode("utf-8")
+        wanted = text_hash(key)
+        position = bisect_left(self._hashes, wanted)
+        while position < len(self._hashes) and self._hashes[position] == wanted:
+            if self._texts.raw(self._order[position]) == key:
+                return self._order[position]
+            position += 1
+        return default
+
+
+class BankWriter:
+    # Streaming .qbank writer. Rows are added one at a time and only the
+    # fixed-size columns (about 20 bytes per question, 12 more for dedupe)
+    # stay in memory; question and answer text is spooled to temporary files
+    # next to `path` until close() assembles the file. With dedupe=True a
+    # question whose text was already added is skipped (add() returns False).
+    def __init__(self, path, dedupe=False):
+        # numpy is imported by the writer's methods only, so loading a bank
+        # (the server's startup path) does not pull it in
+        import numpy as np
+
+        self.path = path
+        self.dedupe = dedupe
+        directory = os.path.dirname(os.path.abspath(path))
+        self._question_blob = tempfile.TemporaryFile(dir=directory)
+        self._answer_blob = tempfile.TemporaryFile(dir=directory)
+        self._question_offsets = array("I", [0])
+        self._answer_offsets = array("I", [0])
+        self._hashes = array("Q")
+        self.difficulty = array("b")
+        self.category = array("H")
+        self.category_names = []
+        self._category_codes = {}
+        # Dedupe index: ids sorted by text hash, plus the ids added since the
+        # last merge (hash -> ids), so memory stays at two arrays, not a dict
+        # entry per question
+        self._seen_hashes = np.zeros(0, dtype=np.uint64)
+        self._seen_ids = np.zeros(0, dtype=np.int32)
+        self._pending = {}
+
+    def __len__(self):
+        return len(self.difficulty)
+
+    def add(self, question, answer, difficulty, category):
+        raw = str(question).encode("utf-8")
+        digest = text_hash(raw)
+        if self.dedupe:
+            if any(self._question_text(question_id) == raw for question_id in self._candidates(digest)):
+                return False
+            self._pending.setdefault(digest, []).append(len(self))
+
+        answer_raw = str(answer).encode("utf-8")
+        self._question_blob.write(raw)
+        self._question_offsets.append(self._question_offsets[-1] + len(raw))
+        self._answer_blob.write(answer_raw)
+        self._answer_offsets.append(self._answer_offsets[-1] + len(answer_raw))
+        self._hashes.append(digest)
+        self.difficulty.append(int(difficulty))
+
+        code = self._category_codes.get(category)
+        if code is None:
+            # 65535 marks a difficulty-only bucket while writing
+            if len(self.category_names) == 65535:
+                raise ValueError("Question banks hold at most 65535 categories")
+            code = self._category_codes[category] = len(self.category_names)
+            self.category_names.append(category)
+        self.category.append(code)
+        if len(self._pending) >= MERGE_EVERY:
+            self._merge_pending()
+        return True
+
+    def _candidates(self, digest):
+        # Ids already added whose question has this hash
+        import numpy as np
+
+        yield from self._pending.get(digest, ())
+        wanted = np.uint64(digest)
+        position = int(np.searchsorted(self._seen_hashes, wanted))
+        while position < len(self._seen_hashes) and self._seen_hashes[position] == wanted:
+            yield int(self._seen_ids[position])
+            position += 1
+
+    def _merge_pending(self):
+        import numpy as np
+
+        ids = np.fromiter((question_id for ids in self._pending.values() for question_id in ids), dtype=np.int32)
+        hashes = np.frombuffer(self._hashes, dtype=np.uint64)[ids]
+        self._seen_hashes = np.concatenate((self._seen_hashes, hashes))
+        self._seen_ids = np.concatenate((self._seen_ids, ids))
+        order = np.argsort(self._seen_hashes, kind="stable")
+        self._seen_hashes = self._seen_hashes[order]
+        self._seen_ids = self._seen_ids[order]
+        self._pending = {}
+
+    def _question_text(self, question_id):
+        # Only on a hash match, so the buffered spool is rarely flushed
+        self._question_blob.flush()
+        start = self._question_offsets[question_id]
+        return os.pread(self._question_blob.fileno(), self._question_offsets[question_id + 1] - start, start)
+
+    def close(self):
+        # Written to a temporary file and renamed, so a running server (or the
+        # model registry watching the path) never maps a half-written file
+        import numpy as np
+
+        _check_byteorder()
+        hashes = np.frombuffer(self._hashes, dtype=np.uint64)
+        text_order = np.argsort(hashes, kind="stable").astype(np.int32)
+
+        # Difficulty buckets, then (level, category) cells, ids ascending in
+        # each; a stable sort on the key keeps ids in order within a bucket
+        difficulty = np.frombuffer(self.difficulty, dtype=np.int8).astype(np.int64)
+        category = np.frombuffer(self.category, dtype=np.uint16).astype(np.int64)
+        bucket_table = array("i")
+        bucket_ids = []
+        start = 0
+        for keys in (difficulty * 65536 + 65535, difficulty * 65536 + category):
+            order = np.argsort(keys, kind="stable")
+            values, counts = np.unique(keys[order], return_counts=True)
+            for key, count in zip(values.tolist(), counts.tolist()):
+                code = key % 65536
+                bucket_table.extend((key // 65536, NO_CATEGORY if code == 65535 else code, start, count))
+                start += count
+            bucket_ids.append(order.astype(np.int32).tobytes())
+
+        category_offsets, category_blob = _string_sections(self.category_names)
+        self._question_blob.flush()
+        self._answer_blob.flush()
+        sections = {
+            "difficulty": self.difficulty.tobytes(),
+            "category": self.category.tobytes(),
+            "question_offsets": self._question_offsets.tobytes(),
+            "question_blob": self._question_blob,
+            "answer_offsets": self._answer_offsets.tobytes(),
+            "answer_blob": self._answer_blob,
+            "category_offsets": category_offsets,
+            "category_blob": category_blob,
+            "text_order": text_order.tobytes(),
+            "bucket_table": bucket_table.tobytes(),
+            "bucket_ids": b"".join(bucket_ids),
+            "text_hash": hashes[text_order].tobytes(),
+        }
+        lengths = {"question_blob": self._question_offsets[-1], "answer_blob": self._answer_offsets[-1]}
+
+        table = []
+        position = HEADER_SIZE
+        for name in SECTIONS:
+            position += -position % 8
+            length = lengths[name] if name in lengths else len(sections[name])
+            table.append((position, length))
+            position += length
+
+        # Per process: several server workers may rebuild the same bank at once
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(self), len(self.category_names)))
+                for offset, length in table:
+                    f.write(SECTION_ENTRY.pack(offset, length))
+                for name, (offset, _) in zip(SECTIONS, table):
+                    f.write(b"\0" * (offset - f.tell()))
+                    if name in lengths:
+                        sections[name].seek(0)
+                        shutil.copyfileobj(sections[name], f, COPY_BUFFER)
+                    else:
+                        f.write(sections[name])
+            os.replace(temp_path, self.path)
+        finally:
+            self.abort()
+
+    def abort(self):
+        self._question_blob.close()
+        self._answer_blob.close()
+
+
+def _string_sections(values):
+    encoded = [str(value).encode("utf-8") for value in values]
+    offsets = array("I", [0])
+    for item in encoded:
+        offsets.append(offsets[-1] + len(item))
+    return offsets.tobytes(), b"".join(encoded)
+
+
+def _check_byteorder():
+    # Sections are cast in native order, which the format fixes as little-endian
+    if sys.byteorder != "little":
+        raise RuntimeError("Question bank files are only supported on little-endian hosts")
+
+
+def write_bank(bank, path):
+    writer = BankWriter(path)
+    for question_id in range(len(bank)):
+        writer.add(bank.questions[question_id], bank.answers[question_id],
+                   bank.difficulty[question_id], bank.category_of(question_id))
+    writer.close()
+
+
+def load_bank(path):
+    _check_byteorder()
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+
+    magic, version, _, count, category_count = HEADER.unpack_from(view, 0)
+    if magic != MAGIC or version not in (1, FORMAT_VERSION):
+        raise ValueError(f"{path} is not a version 1 or {FORMAT_VERSION} question bank file")
+    sections = {}
+    for index, name in enumerate(SECTIONS if version == FORMAT_VERSION else SECTIONS_V1):
+        offset, length = SECTION_ENTRY.unpack_from(view, HEADER.size + index * SECTION_ENTRY.size)
+        sections[name] = view[offset:offset + length]
+
+    questions = StringTable(sections["question_offsets"].cast("I"), sections["question_blob"])
+    answers = StringTable(sections["answer_offsets"].cast("I"), sections["answer_blob"])
+    category_names = list(StringTable(sections["category_offsets"].cast("I"), sections["category_blob"]))
+
+    by_difficulty = {}
+    by_cell = {}
+    bucket_ids = sections["bucket_ids"].cast("i")
+    table = sections["bucket_table"].cast("i")
+    for row in range(0, len(table), 4):
+        level, code, start, length = table[row:row + 4]
+        ids = bucket_ids[start:start + length]
+        if code == NO_CATEGORY:
+            by_difficulty[level] = ids
+        else:
+            by_cell[(level, code)] = ids
+
+    text_order = sections["text_order"].cast("i")
+    if version == FORMAT_VERSION:
+        text_index = HashedTextIndex(questions, text_order, sections["text_hash"].cast("Q"))
+    else:
+        text_index = TextIndex(questions, text_order)
+    bank = QuestionBank.from_parts(
+        questions, answers,
+        sections["difficulty"].cast("b"), sections["category"].cast("H"), category_names,
+        by_difficulty, by_cell, text_index,
+    )
+    if len(bank) != count or len(category_names) != category_count:
+        raise ValueError(f"{path} is truncated or corrupt")
+    # The bank's columns are views into this map
+    bank.mapped = mapped
+    return bank
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join("QuizBackend", "data", "preprocessed_dataset.csv")
+    bank_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join("QuizBackend", "data", "question_bank.qbank")
+    write_bank(QuestionBank.from_dataframe(pd.read_csv(csv_path)), bank_path)
+    print(f"✅ Question bank written to {bank_path}")
@@ -0,0 +1,300 @@
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+
+from bank_file import load_bank, write_bank
+from question_bank import QuestionBank
+from quiz_plan import walk_plan
+
+# Load test for the quiz API, run in-process with Flask's test client against
+# a throwaway SQLite database. From the repository root:
+#   python QuizBackend/benchmark.py --users 16 --quizzes 3 --bank-size 5000 --output bench.json
+# With --url the same workload goes over HTTP to a running server instead
+# (e.g. one started by serve.py), which is how serving modes are compared.
+# Every simulated user registers, logs in and plays full quizzes
+# (start_quiz, next_question/submit_answer until completion, quiz_results),
+# then reads the leaderboard and previous_records. --combined plays quizzes
+# through answer_and_next instead, --plan fetches a whole quiz_plan, walks it
+# locally and posts the answers to submit_quiz_re, and --rtt-ms adds a simulated network
+# round trip to every request (the "quiz" row times whole quizzes, which is
+# where the combined endpoint shows). Latency percentiles and throughput are
+# reported per endpoint; --output writes them as JSON and --baseline
+# compares against an earlier run, exiting 1 on a p95 regression.
+
+BASE_BANK_PATH = os.path.join("QuizBackend", "data", "question_bank.qbank")
+PERCENTILES = (50, 95, 99)
+# Safety stop for quizzes that never report completion
+MAX_STEPS_PER_QUIZ = 50
+
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile over an already sorted list
+    if not sorted_values:
+        return None
+    rank = max(1, -(-pct * len(sorted_values) // 100))
+    return sorted_values[rank - 1]
+
+
+def synthetic_bank(size, path):
+    # Repeats the shipped bank with numbered question texts, so banks of any
+    # size keep the real mix of difficulties, categories and answers
+    base = load_bank(BASE_BANK_PATH)
+    rows = [base.row(index % len(base)) for index in range(size)]
+    bank = QuestionBank(
+        [row["Question"] if index < len(base) else f"{row['Question']} (#{index})" for index, row in enumerate(rows)],
+        [row["Correct Answer"] for row in rows],
+        [row["Difficulty"] for row in rows],
+        [row["Category"] for row in rows],
+    )
+    write_bank(bank, path)
+
+
+class HTTPResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def get_json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class HTTPClient:
+    # The slice of Flask's test client the workload uses, over real HTTP with
+    # one cookie jar (so one session) per simulated user
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        self._opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def get(self, path):
+        return self._send("GET", path)
+
+    def post(self, path, json=None):
+        return self._send("POST", path, json)
+
+    def _send(self, method, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        request = urllib.request.Request(self.base_url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with self._opener.open(request, timeout=60) as response:
+                return HTTPResponse(response.status, response.read())
+        except HTTPError as e:
+            return HTTPResponse(e.code, e.read())
+
+
+class Recorder:
+    def __init__(self, rtt=0.0):
+        self._lock = threading.Lock()
+        self.rtt = rtt
+        self.samples = {}
+        self.errors = {}
+
+    def call(self, endpoint, send, *args, **kwargs):
+        started = time.perf_counter()
+        if self.rtt:
+            time.sleep(self.rtt)
+        response = send(*args, **kwargs)
+        self.record(endpoint, time.perf_counter() - started, response.status_code >= 500)
+        return response
+
+    def record(self, endpoint, elapsed, failed=False):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append(elapsed)
+            if failed:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def play_planned_quiz(client, recorder, quiz, user_index):
+    plan = recorder.call("quiz_plan", client.get, "/api/quiz_plan").get_json()
+    if not plan or "questions" not in plan:
+        return
+
+    def answer_correctly(step, question_id):
+        return (step + quiz + user_index) % 2 == 1
+
+    answers = []
+    for step, question_id in enumerate(walk_plan(plan, answer_correctly)):
+        question = plan["questions"][str(question_id)]
+        answer = question["correct_answer"] if answer_correctly(step, question_id) else "wrong answer"
+        answers.append({"question": question["question"], "user_answer": answer})
+    recorder.call("submit_quiz_re", client.post, "/api/submit_quiz_re", json={"answers": answers})
+
+
+def simulate_user(make_client, recorder, user_index, quizzes, run_id, combined=False, plan=False):
+    client = make_client()
+    credentials = {"username": f"bench-{run_id}-{user_index}", "password": "bench-password"}
+    recorder.call("register", client.post, "/api/register", json=credentials)
+    recorder.call("login", client.post, "/api/login", json=credentials)
+
+    for quiz in range(quizzes):
+        started = time.perf_counter()
+        if plan:
+            play_planned_quiz(client, recorder, quiz, user_index)
+            recorder.record("quiz", time.perf_counter() - started)
+            continue
+        recorder.call("start_quiz", client.post, "/api/start_quiz")
+        question = recorder.call("next_question", client.get, "/api/next_question").get_json()
+        for step in range(MAX_STEPS_PER_QUIZ):
+            if "question" not in question:
+                break
+            # Alternate right and wrong answers so knowledge moves both ways
+            answer = question["correct_answer"] if (step + quiz + user_index) % 2 else "wrong answer"
+            if combined:
+                response = recorder.call("answer_and_next", client.post, "/api/answer_and_next", json={"answer": answer})
+                question = (response.get_json() or {}).get("next", {})
+            else:
+                recorder.call("submit_answer", client.post, "/api/submit_answer", json={"answer": answer})
+                question = recorder.call("next_question", client.get, "/api/next_question").get_json()
+        recorder.call("quiz_results", client.get, "/api/quiz_results")
+        recorder.record("quiz", time.perf_counter() - started)
+
+    recorder.call("leaderboard", client.get, "/api/leaderboard?limit=10")
+    recorder.call("previous_records", client.get, "/api/previous_records?limit=10")
+
+
+def summarize(recorder, wall_seconds):
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        samples = sorted(samples)
+        result = {
+            "count": len(samples),
+            "errors": recorder.errors.get(endpoint, 0),
+            "throughput_rps": round(len(samples) / wall_seconds, 2),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3),
+        }
+        for pct in PERCENTILES:
+            result[f"p{pct}_ms"] = round(percentile(samples, pct) * 1000, 3)
+        endpoints[endpoint] = result
+    total = sum(result["count"] for result in endpoints.values())
+    return {
+        "wall_seconds": round(wall_seconds, 3),
+        "total_requests": total,
+        "throughput_rps": round(total / wall_seconds, 2),
+        "endpoints": endpoints,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(summary):
+    print(f"{'endpoint':<18}{'count':>7}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for endpoint, result in summary["endpoints"].items():
+        print(f"{endpoint:<18}{result['count']:>7}{result['throughput_rps']:>9.1f}{result['p50_ms']:>9.2f}"
+              f"{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}{result['errors']:>8}")
+    print(f"{summary['total_requests']} requests in {summary['wall_seconds']}s ({summary['throughput_rps']} req/s)")
+
+
+def compare(summary, baseline, tolerance):
+    # Endpoints whose p95 grew by more than `tolerance` (0.2 = 20%) over the baseline
+    regressions = []
+    for endpoint, result in summary["endpoints"].items():
+        before = baseline["results"]["endpoints"].get(endpoint)
+        if before and result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append((endpoint, before["p95_ms"], result["p95_ms"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the quiz API end to end.")
+    parser.add_argument("--users", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--quizzes", type=int, default=2, help="quizzes played per user")
+    parser.add_argument("--bank-size", type=int, default=None, help="synthetic bank size (default: the shipped bank)")
+    parser.add_argument("--policy", choices=("heuristic", "dqn"), default="heuristic")
+    parser.add_argument("--write-behind", action="store_true", help="run with WRITE_BEHIND=1")
+    parser.add_argument("--combined", action="store_true", help="answer through /api/answer_and_next")
+    parser.add_argument("--plan", action="store_true", help="play quizzes from /api/quiz_plan, answers in bulk")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated network round trip added per request")
+    parser.add_argument("--url", help="benchmark a running server at this base URL instead of in-process")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="earlier --output file to compare p95 latencies against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 growth over the baseline")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="quiz-bench-")
+    # Registered before Quiz's own exit hooks, so it runs after them
+    atexit.register(shutil.rmtree, workdir, True)
+    bank_path = BASE_BANK_PATH
+    if args.bank_size and not args.url:
+        bank_path = os.path.join(workdir, "bank.qbank")
+        synthetic_bank(args.bank_size, bank_path)
+
+    write_buffer = None
+    if args.url:
+        # The server's own configuration applies; --bank-size, --policy and
+        # --write-behind only shape in-process runs
+        def make_client():
+            return HTTPClient(args.url)
+    else:
+        # Quiz.py reads its configuration at import
+        os.environ.update({
+            "DB_BACKEND": "sqlite",
+            "DB_SQLITE_PATH": os.path.join(workdir, "quiz.sqlite3"),
+            "SESSION_BACKEND": "lru",
+            "QUIZ_DATASET_PATH": bank_path,
+            "QUESTION_POLICY": args.policy,
+            "WRITE_BEHIND": "1" if args.write_behind else "0",
+            "DB_POOL_SIZE": str(max(5, args.users)),
+        })
+        import Quiz
+
+        if args.policy == "dqn":
+            # Let the background model load finish so it is not part of the measurement
+            while Quiz.registry.status()["active"]["model_version"] == 0 and os.path.exists(Quiz.registry.model_path):
+                time.sleep(0.1)
+        make_client = Quiz.app.test_client
+        write_buffer = Quiz.write_buffer
+
+    recorder = Recorder(args.rtt_ms / 1000)
+    run_id = int(time.time())
+    threads = [threading.Thread(target=simulate_user,
+                                args=(make_client, recorder, index, args.quizzes, run_id, args.combined, args.plan))
+               for index in range(args.users)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if write_buffer is not None:
+        write_buffer.flush()
+    summary = summarize(recorder, time.perf_counter() - started)
+
+    report = {
+        "config": {**vars(args), "bank_size": None if args.url else len(load_bank(bank_path))},
+        "environment": {"commit": git_commit(), "python": sys.version.split()[0], "platform": platform.platform()},
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": summary,
+    }
+    print_table(summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(summary, json.load(f), args.tolerance)
+        for endpoint, before, after in regressions:
+            print(f"REGRESSION {endpoint}: p95 {before:.2f}ms -> {after:.2f}ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+
+from storage import QuizRepository, SQLiteBackend, backend_from_env
+
+# EXPLAIN check for the hot queries: each must reach its rows through an
+# index, never by scanning a whole table. From the repository root:
+#   python QuizBackend/check_query_plans.py               (fresh SQLite database)
+#   python QuizBackend/check_query_plans.py --configured  (the DB_BACKEND from .env)
+# Prints every plan and exits 1 if any hot query scans a table. Add a query
+# here when a route starts filtering on something new.
+
+HOT_QUERIES = (
+    ("login", "SELECT * FROM users WHERE user_name = %s", ("someone",)),
+    ("latest quiz", "SELECT * FROM Quiz WHERE user_id = %s ORDER BY attempt_id DESC LIMIT 1", (1,)),
+    ("attempt counter", "UPDATE users SET last_attempt_id = last_attempt_id + 1 WHERE user_id = %s", (1,)),
+    ("latest attempt number", "SELECT MAX(attempt_id) FROM Quiz WHERE user_id = %s", (1,)),
+    ("quiz history page",
+     "SELECT * FROM Quiz WHERE user_id = %s AND quiz_id < %s ORDER BY quiz_id DESC LIMIT %s", (1, 100, 10)),
+    ("history questions", "SELECT * FROM Question WHERE quiz_id IN (%s, %s, %s)", (1, 2, 3)),
+    ("incorrect answers", """
+        SELECT description, correct_answer, weakarea, COUNT(*) AS attempt_count
+        FROM Question
+        WHERE is_correct = 0 AND quiz_id IN (
+            SELECT quiz_id FROM Quiz WHERE user_id = %s AND attempt_id = %s
+        )
+        GROUP BY description, correct_answer, weakarea
+        ORDER BY attempt_count DESC
+        LIMIT %s
+    """, (1, 1, 10)),
+    ("best attempt",
+     "SELECT quiz_id, attempt_id, score FROM Quiz WHERE user_id = %s ORDER BY score DESC, quiz_id LIMIT 1", (1,)),
+    ("leaderboard entry", "SELECT quiz_id, score FROM LeaderboardBest WHERE user_id = %s", (1,)),
+    ("watched videos", "SELECT video_id, watched FROM VideoTrack WHERE user_id = %s AND quiz_id = %s", (1, 1)),
+    ("video history", """
+        SELECT vt.quiz_id, vt.video_id, vr.weakarea, vr.video_title, vt.watched, vt.clicked_at
+        FROM VideoTrack vt
+        JOIN VideoResources vr ON vt.video_id = vr.video_id
+        WHERE vt.user_id = %s
+        ORDER BY vt.quiz_id DESC, vt.clicked_at DESC
+    """, (1,)),
+    ("video reset", "DELETE FROM VideoTrack WHERE user_id = %s", (1,)),
+    ("user question delete", "DELETE FROM Question WHERE quiz_id IN (SELECT quiz_id FROM Quiz WHERE user_id = %s)", (1,)),
+)
+
+# SQLite reports table scans as "SCAN <table or alias>"; these are not tables
+SQLITE_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW|\(subquery|SUBQUERY)(\w+)")
+
+
+def full_scans(backend_name, plan):
+    # Tables the plan reads end to end
+    scanned = []
+    for step in plan:
+        if backend_name == "sqlite":
+            match = SQLITE_SCAN.match(step["detail"])
+            if match:
+                scanned.append(match.group(1))
+        # MySQL: ALL is a table scan, index a scan of a whole index
+        elif step.get("type") in ("ALL", "index"):
+            scanned.append(step["table"])
+    return scanned
+
+
+def describe(backend_name, plan):
+    if backend_name == "sqlite":
+        return [step["detail"] for step in plan]
+    return [f"{step['table']}: type={step['type']} key={step['key']}" for step in plan]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the hot queries use indexes.")
+    parser.add_argument("--configured", action="store_true", help="check the backend configured in the environment")
+    args = parser.parse_args()
+
+    if args.configured:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        backend = backend_from_env()
+    else:
+        workdir = tempfile.mkdtemp(prefix="quiz-plans-")
+        backend = SQLiteBackend(os.path.join(workdir, "quiz.sqlite3"))
+    repository = QuizRepository(backend, leaderboard_refresh=0)
+
+    failures = 0
+    for name, sql, params in HOT_QUERIES:
+        plan = repository.explain(sql, params)
+        scanned = full_scans(backend.name, plan)
+        print(f"{'SCAN' if scanned else 'ok':<5}{name}")
+        for line in describe(backend.name, plan):
+            print(f"       {line}")
+        if scanned:
+            failures += 1
+            print(f"       full scan of {', '.join(scanned)}")
+
+    if not args.configured:
+        repository.pool.close_all()
+        shutil.rmtree(workdir, True)
+    if failures:
+        print(f"{failures} hot queries scan a table")
+        sys.exit(1)
+    print(f"All {len(HOT_QUERIES)} hot queries use an index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from instrumentation import metrics, instrument_connection
+
+# Connection pooling for the API. Connections are checked out with
+# `with pool.connection() as conn:` and always come back to the pool, rolled
+# back, even when the route raises or returns early.
+
+DEFAULT_POOL_SIZE = 5
+# Seconds to wait for a free connection before giving up
+DEFAULT_POOL_TIMEOUT = 10.0
+# Idle connections older than this are pinged (and reconnected) on checkout
+DEFAULT_PING_AFTER = 30.0
+
+
+class ConnectionPool:
+    def __init__(self, factory, size=DEFAULT_POOL_SIZE, timeout=DEFAULT_POOL_TIMEOUT, ping_after=DEFAULT_PING_AFTER):
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.discarded = 0
+
+    @contextmanager
+    def connection(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No database connection available within {self.timeout}s")
+        conn = None
+        try:
+            conn = self._checkout()
+            if metrics.enabled:
+                metrics.add("db_wait", time.perf_counter() - started)
+            yield instrument_connection(conn)
+        finally:
+            if conn is not None:
+                self._release(conn)
+            self._slots.release()
+
+    def close_all(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(conn)
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "created": self.created,
+            "discarded": self.discarded,
+        }
+
+    def _connect(self):
+        conn = self._factory()
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _checkout(self):
+        try:
+            conn, returned_at = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+        if time.monotonic() - returned_at > self.ping_after and not self._healthy(conn):
+            self._close(conn)
+            return self._connect()
+        return conn
+
+    def _release(self, conn):
+        # Never hand out a connection with a half-finished transaction
+        try:
+            conn.rollback()
+        except Exception:
+            self._close(conn)
+            return
+        self._idle.put((conn, time.monotonic()))
+
+    @staticmethod
+    def _healthy(conn):
+        try:
+            conn.ping(reconnect=True, attempts=1, delay=0)
+            return True
+        except Exception:
+            return False
+
+    def _close(self, conn):
+        with self._lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# SQLite stand-in shaped like mysql.connector, so routes keep their SQL
+# (%s placeholders, cursor(dictionary=True), NOW()) when run without a server.
+class SQLiteCursor:
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(sql.replace("%s", "?"), tuple(params or ()))
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(sql.replace("%s", "?"), [tuple(p) for p in seq_of_params])
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {column[0]: value for column, value in zip(self._cursor.description, row)}
+
+
+class SQLiteConnection:
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES)
+        self._conn.create_function("NOW", 0, lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    @property
+    def raw(self):
+        return self._conn
+
+    def cursor(self, dictionary=False):
+        return SQLiteCursor(self._conn.cursor(), dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._conn.execute("SELECT 1")
+
+
+def mysql_factory():
+    import mysql.connector
+
+    # DB_MYSQL_PURE=1 selects the pure-Python protocol, whose socket I/O gevent can switch on
+    return lambda: mysql.connector.connect(
+        host=os.getenv('DB_HOST'),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=os.getenv('DB_NAME'),
+        use_pure=os.getenv('DB_MYSQL_PURE') == "1"
+    )
+
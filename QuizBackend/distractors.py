@@ -0,0 +1,58 @@
+import random
+
+# Wrong-answer pools for multiple-choice options, built once from the bank.
+# Distractors are drawn by rejection on random indices, so serving a question
+# never scans or copies the answer pool.
+
+# Pools at or below this size are filtered directly instead of probed
+SMALL_POOL_SIZE = 16
+# Random probes per requested distractor before falling back to a filter
+PROBES_PER_PICK = 8
+
+
+class DistractorPool:
+    def __init__(self, answers, categories=None):
+        # Unique answers in first-seen order, globally and per category
+        self.pool = list(dict.fromkeys(answers))
+        self.by_category = {}
+        if categories is not None:
+            grouped = {}
+            for answer, category in zip(answers, categories):
+                grouped.setdefault(category, {})[answer] = None
+            self.by_category = {category: list(pool) for category, pool in grouped.items()}
+
+    @classmethod
+    def from_bank(cls, bank):
+        categories = [bank.category_of(question_id) for question_id in range(len(bank))]
+        return cls(bank.answers, categories)
+
+    def sample(self, correct_answer, k=3, category=None):
+        # Same-category answers make more plausible distractors; the global
+        # pool tops up categories that are too small
+        picked = []
+        if category is not None:
+            self._draw(self.by_category.get(category, ()), correct_answer, k, picked)
+        if len(picked) < k:
+            self._draw(self.pool, correct_answer, k, picked)
+        return picked
+
+    def options(self, correct_answer, k=3, category=None):
+        options = [correct_answer] + self.sample(correct_answer, k, category)
+        random.shuffle(options)
+        return options
+
+    @staticmethod
+    def _draw(pool, correct_answer, k, out):
+        size = len(pool)
+        if size > SMALL_POOL_SIZE:
+            for _ in range(PROBES_PER_PICK * k):
+                if len(out) >= k:
+                    return
+                answer = pool[random.randrange(size)]
+                if answer != correct_answer and answer not in out:
+                    out.append(answer)
+            if len(out) >= k:
+                return
+
+        candidates = [answer for answer in pool if answer != correct_answer and answer not in out]
+        out.extend(random.sample(candidates, min(len(candidates), k - len(out))))
@@ -0,0 +1,299 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+from flask.json.provider import DefaultJSONProvider
+
+# Per-request timing spans and Prometheus-style metrics (METRICS=1).
+# A request's time is broken down by span kind: db (cursor calls and the rows
+# they return), db_wait (pool checkout), session (load/save), bank (question
+# bank lookups), inference (policy server round trip) and json (encoding).
+# SLOW_REQUEST_MS=N also turns recording on and prints the breakdown of any
+# request slower than N ms. When both are off, span() hands back a shared
+# null context and connections are not wrapped, so the cost is one flag check.
+
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_NULL_SPAN = nullcontext()
+
+
+class RequestRecord:
+    __slots__ = ("method", "route", "started", "spans", "rows")
+
+    def __init__(self, method):
+        self.method = method
+        self.route = None
+        self.started = time.perf_counter()
+        # kind -> [calls, seconds]
+        self.spans = {}
+        self.rows = 0
+
+
+class Metrics:
+    def __init__(self, enabled=False, slow_request_ms=None):
+        self.configure(enabled, slow_request_ms)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (method, route, status) -> count
+        self.requests = {}
+        # route -> [bucket counts..., +Inf count, sum]
+        self.latency = {}
+        # (route, kind) -> [calls, seconds]
+        self.spans = {}
+        self.db_rows = {}
+        self._gauges = []
+
+    def configure(self, enabled, slow_request_ms=None):
+        self.enabled = enabled or slow_request_ms is not None
+        self.slow_request_ms = slow_request_ms
+
+    def register_gauges(self, collect):
+        # collect() returns [(name, help, {label: value}, value), ...] at scrape time
+        self._gauges.append(collect)
+
+    def begin(self, method):
+        record = RequestRecord(method)
+        self._local.record = record
+        return record
+
+    def current(self):
+        return getattr(self._local, "record", None)
+
+    def helper_record(self, record):
+        # A record of its own for a helper thread working for `record` (None
+        # when not recording), so the two threads never share one. Fold it
+        # back with merge() once the helper is done.
+        return RequestRecord(record.method) if record is not None else None
+
+    def merge(self, record, helper):
+        if record is None or helper is None:
+            return
+        for kind, (calls, seconds) in helper.spans.items():
+            totals = record.spans.setdefault(kind, [0, 0.0])
+            totals[0] += calls
+            totals[1] += seconds
+        record.rows += helper.rows
+
+    @contextmanager
+    def attached(self, record):
+        # Charges the calling thread's spans to `record` (see helper_record)
+        previous = getattr(self._local, "record", None)
+        self._local.record = record
+        try:
+            yield
+        finally:
+            self._local.record = previous
+
+    def set_route(self, route):
+        record = getattr(self._local, "record", None)
+        if record is not None:
+            record.route = route
+
+    def end(self, record, status):
+        self._local.record = None
+        elapsed = time.perf_counter() - record.started
+        route = record.route or "unmatched"
+        with self._lock:
+            key = (record.method, route, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.latency.setdefault(route, [0] * (len(LATENCY_BUCKETS) + 1) + [0.0])
+            histogram[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            histogram[-1] += elapsed
+            for kind, (calls, seconds) in record.spans.items():
+                totals = self.spans.setdefault((route, kind), [0, 0.0])
+                totals[0] += calls
+                totals[1] += seconds
+            self.db_rows[route] = self.db_rows.get(route, 0) + record.rows
+
+        if self.slow_request_ms is not None and elapsed * 1000 >= self.slow_request_ms:
+            breakdown = ", ".join(f"{kind} {calls}x {seconds * 1000:.1f}ms" for kind, (calls, seconds) in record.spans.items())
+            print(f"Slow request: {record.method} {route} {status} {elapsed * 1000:.1f}ms ({breakdown or 'no spans'}; {record.rows} rows)")
+
+    def span(self, kind):
+        if not self.enabled:
+            return _NULL_SPAN
+        return self._span(kind)
+
+    @contextmanager
+    def _span(self, kind):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(kind, time.perf_counter() - started)
+
+    def add(self, kind, seconds):
+        record = getattr(self._local, "record", None)
+        if record is None:
+            # Background work (write-behind, registry) is charged to its own route
+            with self._lock:
+                totals = self.spans.setdefault(("background", kind), [0, 0.0])
+                totals[0] += 1
+                totals[1] += seconds
+            return
+        totals = record.spans.setdefault(kind, [0, 0.0])
+        totals[0] += 1
+        totals[1] += seconds
+
+    def add_rows(self, rows):
+        record = getattr(self._local, "record", None)
+        if record is not None:
+            record.rows += rows
+        else:
+            with self._lock:
+                self.db_rows["background"] = self.db_rows.get("background", 0) + rows
+
+    def render(self):
+        if not self.enabled:
+            return "# metrics disabled (set METRICS=1)\n"
+        lines = []
+        with self._lock:
+            lines += ["# HELP quiz_requests_total Requests handled, by route and status.",
+                      "# TYPE quiz_requests_total counter"]
+            for (method, route, status), count in sorted(self.requests.items()):
+                lines.append(f'quiz_requests_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+
+            lines += ["# HELP quiz_request_duration_seconds Request latency.",
+                      "# TYPE quiz_request_duration_seconds histogram"]
+            for route, histogram in sorted(self.latency.items()):
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), histogram):
+                    cumulative += count
+                    lines.append(f'quiz_request_duration_seconds_bucket{{route="{route}",le="{bound}"}} {cumulative}')
+                lines.append(f'quiz_request_duration_seconds_sum{{route="{route}"}} {histogram[-1]:.6f}')
+                lines.append(f'quiz_request_duration_seconds_count{{route="{route}"}} {cumulative}')
+
+            lines += ["# HELP quiz_span_seconds_total Time spent in each span kind, by route.",
+                      "# TYPE quiz_span_seconds_total counter"]
+            for (route, kind), (_, seconds) in sorted(self.spans.items()):
+                lines.append(f'quiz_span_seconds_total{{route="{route}",kind="{kind}"}} {seconds:.6f}')
+            lines += ["# HELP quiz_span_calls_total Span count, by route and kind.",
+                      "# TYPE quiz_span_calls_total counter"]
+            for (route, kind), (calls, _) in sorted(self.spans.items()):
+                lines.append(f'quiz_span_calls_total{{route="{route}",kind="{kind}"}} {calls}')
+
+            lines += ["# HELP quiz_db_rows_total Rows fetched from the database, by route.",
+                      "# TYPE quiz_db_rows_total counter"]
+            for route, rows in sorted(self.db_rows.items()):
+                lines.append(f'quiz_db_rows_total{{route="{route}"}} {rows}')
+
+        seen = set()
+        for collect in self._gauges:
+            for name, help_text, labels, value in collect():
+                if name not in seen:
+                    seen.add(name)
+                    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every module; Quiz.py configures it once .env is loaded
+metrics = Metrics()
+
+
+def configure_from_env():
+    slow = os.getenv("SLOW_REQUEST_MS")
+    metrics.configure(os.getenv("METRICS") == "1", float(slow) if slow else None)
+
+
+def span(kind):
+    return metrics.span(kind)
+
+
+class InstrumentedCursor:
+    # Times execute/executemany and counts fetched rows; everything else is passed through
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.execute(*args, **kwargs)
+        finally:
+            metrics.add("db", time.perf_counter() - started)
+
+    def executemany(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self._cursor.executemany(*args, **kwargs)
+        finally:
+            metrics.add("db", time.perf_counter() - started)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            metrics.add_rows(1)
+        return row
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        metrics.add_rows(len(rows))
+        return rows
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        metrics.add_rows(len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            metrics.add_rows(1)
+            yield row
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def instrument_connection(conn):
+    return InstrumentedConnection(conn) if metrics.enabled else conn
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    # jsonify() and response bodies encoded through app.json count as "json" spans
+    def dumps(self, obj, **kwargs):
+        with span("json"):
+            return super().dumps(obj, **kwargs)
+
+
+class MetricsMiddleware:
+    # WSGI wrapper, so the session load (which Flask does before any
+    # before_request hook) falls inside the request's record
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if not metrics.enabled:
+            return self.wsgi_app(environ, start_response)
+
+        record = metrics.begin(environ.get("REQUEST_METHOD", "GET"))
+        status = ["500"]
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            status[0] = status_line.split(" ", 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, recording_start_response)
+        finally:
+            # Streamed bodies are produced after this point and are not timed
+            metrics.end(record, status[0])
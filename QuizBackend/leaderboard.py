@@ -0,0 +1,72 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+# In-memory best-score-per-user index behind /api/leaderboard.
+# The LeaderboardBest summary table is the source of truth; this index is
+# updated in place by the writes made in this process and reloaded from the
+# table every `refresh_interval` seconds to pick up other workers' writes
+# (0 disables reloading for single-worker deployments).
+
+COLUMNS = ("user_id", "user_name", "quiz_id", "attempt_id", "score", "knowledge_level", "weakareas")
+
+
+class Leaderboard:
+    def __init__(self, refresh_interval=5.0):
+        self.refresh_interval = refresh_interval
+        self._entries = {}
+        self._order = []
+        self._lock = threading.Lock()
+        self.loaded_at = None
+
+    @staticmethod
+    def _rank_key(entry):
+        # Highest score first, users without a scored attempt last
+        score = entry["score"]
+        return (score is None, -(score or 0), entry["user_id"])
+
+    def needs_reload(self):
+        if self.loaded_at is None:
+            return True
+        return self.refresh_interval > 0 and time.monotonic() - self.loaded_at > self.refresh_interval
+
+    def load(self, rows):
+        entries = {row["user_id"]: {column: row[column] for column in COLUMNS} for row in rows}
+        order = sorted(self._rank_key(entry) for entry in entries.values())
+        with self._lock:
+            self._entries = entries
+            self._order = order
+            self.loaded_at = time.monotonic()
+
+    def update(self, entry):
+        entry = {column: entry[column] for column in COLUMNS}
+        with self._lock:
+            self._discard(entry["user_id"])
+            self._entries[entry["user_id"]] = entry
+            insort(self._order, self._rank_key(entry))
+
+    def remove(self, user_id):
+        with self._lock:
+            self._discard(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._order = []
+
+    def page(self, offset=0, limit=None):
+        with self._lock:
+            end = len(self._order) if limit is None else offset + limit
+            return [dict(self._entries[key[2]]) for key in self._order[offset:end]]
+
+    def __len__(self):
+        return len(self._order)
+
+    def _discard(self, user_id):
+        current = self._entries.pop(user_id, None)
+        if current is None:
+            return
+        key = self._rank_key(current)
+        index = bisect_left(self._order, key)
+        if index < len(self._order) and self._order[index] == key:
+            del self._order[index]
@@ -0,0 +1,295 @@
+from contextlib import contextmanager
+
+# Versioned schema migrations, applied in order by each backend's bootstrap().
+# schema_migrations records the versions that have run. A database created
+# before migrations existed has tables but no record: it starts at version 0
+# and the baseline's CREATE ... IF NOT EXISTS statements leave its tables as
+# they are. Append new migrations; never edit one that has shipped.
+#
+# Indexes and the queries they serve (see check_query_plans.py):
+#   users        uq_users_user_name (user_name)                 login, register (one row per name)
+#   Quiz         idx_quiz_user_attempt (user_id, attempt_id)    latest attempt, retake numbering
+#                idx_quiz_user_quiz (user_id, quiz_id)          history pages, newest first
+#   Question     idx_question_quiz_correct (quiz_id, is_correct) history, incorrect answers
+#   VideoTrack   uq_videotrack_user_quiz_video (user_id, quiz_id, video_id)
+#                                                              watched status, history, and the
+#                                                              conflict key of the track_video upsert
+#
+# Ids are allocated without reading MAX(): users.user_id is assigned by the
+# database and users.last_attempt_id is each user's attempt counter, bumped
+# in place by QuizRepository._allocate_attempt_id.
+
+MIGRATION_LOCK = "quiz_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+
+class Migration:
+    # Statements are SQL strings or callables taking the cursor, for steps
+    # that have to check the schema or data first
+    def __init__(self, version, name, sqlite, mysql):
+        self.version = version
+        self.name = name
+        self.statements = {"sqlite": sqlite, "mysql": mysql}
+
+
+def _require_unique_user_names(cursor):
+    cursor.execute("SELECT user_name FROM users GROUP BY user_name HAVING COUNT(*) > 1 LIMIT 20")
+    duplicates = [row[0] for row in cursor.fetchall()]
+    if duplicates:
+        raise RuntimeError("Usernames must be unique before schema migration 3; rename the duplicates and "
+                           f"restart: {', '.join(duplicates)}")
+
+
+# MySQL commits every DDL statement on its own, so a migration that stops
+# halfway resumes from the top on the next start; these make each DDL step
+# a no-op when it already ran
+def _mysql_has_column(cursor, table, column):
+    cursor.execute("""SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s""", (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def _mysql_has_index(cursor, table, index):
+    cursor.execute("""SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s""", (table, index))
+    return cursor.fetchone()[0] > 0
+
+
+def unless_column(table, column, statement):
+    def step(cursor):
+        if not _mysql_has_column(cursor, table, column):
+            cursor.execute(statement)
+    return step
+
+
+def if_index(table, index, statement):
+    def step(cursor):
+        if _mysql_has_index(cursor, table, index):
+            cursor.execute(statement)
+    return step
+
+
+def unless_index(table, index, statement):
+    def step(cursor):
+        if not _mysql_has_index(cursor, table, index):
+            cursor.execute(statement)
+    return step
+
+
+MIGRATIONS = (
+    Migration(1, "baseline tables", sqlite=[
+        """CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            user_name TEXT NOT NULL,
+            password TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS Quiz (
+            quiz_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(user_id),
+            knowledge_level REAL,
+            score REAL,
+            weakareas TEXT,
+            attempt_id INTEGER
+        )""",
+        """CREATE TABLE IF NOT EXISTS Question (
+            question_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            quiz_id INTEGER NOT NULL REFERENCES Quiz(quiz_id),
+            attempt_id INTEGER,
+            description TEXT,
+            is_correct BOOLEAN,
+            correct_answer TEXT,
+            weakarea TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS VideoResources (
+            video_id INTEGER PRIMARY KEY,
+            weakarea TEXT,
+            video_title TEXT,
+            video_url TEXT,
+            description TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS VideoTrack (
+            track_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL REFERENCES users(user_id),
+            video_id INTEGER NOT NULL REFERENCES VideoResources(video_id),
+            quiz_id INTEGER,
+            watched BOOLEAN,
+            clicked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        """CREATE TABLE IF NOT EXISTS LeaderboardBest (
+            user_id INTEGER PRIMARY KEY REFERENCES users(user_id),
+            user_name TEXT NOT NULL,
+            quiz_id INTEGER,
+            attempt_id INTEGER,
+            score REAL,
+            knowledge_level REAL,
+            weakareas TEXT
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_leaderboard_score ON LeaderboardBest (score)",
+    ], mysql=[
+        """CREATE TABLE IF NOT EXISTS users (
+            user_id INT PRIMARY KEY,
+            user_name VARCHAR(255) NOT NULL,
+            password VARCHAR(255) NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS Quiz (
+            quiz_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            knowledge_level FLOAT,
+            score FLOAT,
+            weakareas TEXT,
+            attempt_id INT,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS Question (
+            question_id INT AUTO_INCREMENT PRIMARY KEY,
+            quiz_id INT NOT NULL,
+            attempt_id INT,
+            description TEXT,
+            is_correct BOOLEAN,
+            correct_answer TEXT,
+            weakarea VARCHAR(255),
+            FOREIGN KEY (quiz_id) REFERENCES Quiz(quiz_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS VideoResources (
+            video_id INT PRIMARY KEY,
+            weakarea VARCHAR(255),
+            video_title VARCHAR(255),
+            video_url VARCHAR(512),
+            description TEXT
+        )""",
+        """CREATE TABLE IF NOT EXISTS VideoTrack (
+            track_id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            video_id INT NOT NULL,
+            quiz_id INT NULL,
+            watched BOOLEAN,
+            clicked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            FOREIGN KEY (video_id) REFERENCES VideoResources(video_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS LeaderboardBest (
+            user_id INT PRIMARY KEY,
+            user_name VARCHAR(255) NOT NULL,
+            quiz_id INT NULL,
+            attempt_id INT NULL,
+            score FLOAT NULL,
+            knowledge_level FLOAT NULL,
+            weakareas TEXT NULL,
+            INDEX idx_leaderboard_score (score)
+        )""",
+    ]),
+    Migration(2, "hot path indexes and unique video tracking", sqlite=[
+        "CREATE INDEX IF NOT EXISTS idx_users_user_name ON users (user_name)",
+        "CREATE INDEX IF NOT EXISTS idx_quiz_user_attempt ON Quiz (user_id, attempt_id)",
+        "CREATE INDEX IF NOT EXISTS idx_quiz_user_quiz ON Quiz (user_id, quiz_id)",
+        "CREATE INDEX IF NOT EXISTS idx_question_quiz_correct ON Question (quiz_id, is_correct)",
+        # Keep the newest row of any duplicate before the key can be unique
+        """DELETE FROM VideoTrack WHERE track_id NOT IN (
+            SELECT MAX(track_id) FROM VideoTrack GROUP BY user_id, quiz_id, video_id
+        )""",
+        "DROP INDEX IF EXISTS idx_videotrack_user_quiz",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_videotrack_user_quiz_video ON VideoTrack (user_id, quiz_id, video_id)",
+    ], mysql=[
+        # Guarded (see unless_index): a failed run resumes from the top
+        unless_index("users", "idx_users_user_name", "CREATE INDEX idx_users_user_name ON users (user_name)"),
+        unless_index("Quiz", "idx_quiz_user_attempt", "CREATE INDEX idx_quiz_user_attempt ON Quiz (user_id, attempt_id)"),
+        unless_index("Quiz", "idx_quiz_user_quiz", "CREATE INDEX idx_quiz_user_quiz ON Quiz (user_id, quiz_id)"),
+        unless_index("Question", "idx_question_quiz_correct", "CREATE INDEX idx_question_quiz_correct ON Question (quiz_id, is_correct)"),
+        """DELETE older FROM VideoTrack older
+        JOIN VideoTrack newer
+            ON newer.user_id = older.user_id AND newer.quiz_id = older.quiz_id
+            AND newer.video_id = older.video_id AND newer.track_id > older.track_id""",
+        unless_index("VideoTrack", "uq_videotrack_user_quiz_video",
+                     "CREATE UNIQUE INDEX uq_videotrack_user_quiz_video ON VideoTrack (user_id, quiz_id, video_id)"),
+    ]),
+    # Refuses to start, leaving the schema at version 2, if two users already
+    # share a name; rename one of them and restart
+    Migration(3, "database-assigned user ids and per-user attempt counters", sqlite=[
+        _require_unique_user_names,
+        # INTEGER PRIMARY KEY is already assigned by SQLite when omitted
+        "ALTER TABLE users ADD COLUMN last_attempt_id INTEGER NOT NULL DEFAULT 0",
+        """UPDATE users SET last_attempt_id = COALESCE(
+            (SELECT MAX(attempt_id) FROM Quiz WHERE Quiz.user_id = users.user_id), 0
+        )""",
+        "DROP INDEX IF EXISTS idx_users_user_name",
+        "CREATE UNIQUE INDEX uq_users_user_name ON users (user_name)",
+    ], mysql=[
+        # Checked before any DDL, which could not be rolled back
+        _require_unique_user_names,
+        # user_id is referenced by foreign keys, which block the change otherwise
+        "SET FOREIGN_KEY_CHECKS = 0",
+        "ALTER TABLE users MODIFY user_id INT NOT NULL AUTO_INCREMENT",
+        "SET FOREIGN_KEY_CHECKS = 1",
+        unless_column("users", "last_attempt_id", "ALTER TABLE users ADD COLUMN last_attempt_id INT NOT NULL DEFAULT 0"),
+        """UPDATE users SET last_attempt_id = COALESCE(
+            (SELECT MAX(attempt_id) FROM Quiz WHERE Quiz.user_id = users.user_id), 0
+        )""",
+        unless_index("users", "uq_users_user_name", "CREATE UNIQUE INDEX uq_users_user_name ON users (user_name)"),
+        if_index("users", "idx_users_user_name", "DROP INDEX idx_users_user_name ON users"),
+    ]),
+)
+
+SCHEMA_MIGRATIONS_TABLE = {
+    "sqlite": """CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    "mysql": """CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+}
+
+
+@contextmanager
+def _migration_lock(conn, dialect):
+    # Workers starting together must not apply the same migration twice
+    if dialect == "sqlite":
+        # One write transaction covers the check and every migration
+        conn.raw.execute("BEGIN IMMEDIATE")
+        yield
+        return
+
+    # MySQL DDL commits implicitly, so a named lock serializes instead
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        raise TimeoutError(f"Schema migration lock not acquired within {MIGRATION_LOCK_TIMEOUT}s")
+    try:
+        yield
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+        cursor.fetchone()
+
+
+def schema_version(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(version) FROM schema_migrations")
+    return cursor.fetchone()[0] or 0
+
+
+def migrate(conn, dialect):
+    # Applies pending migrations; returns the versions applied by this call.
+    # On SQLite they commit together or not at all; on MySQL each DDL
+    # statement commits on its own.
+    applied = []
+    with _migration_lock(conn, dialect):
+        cursor = conn.cursor()
+        cursor.execute(SCHEMA_MIGRATIONS_TABLE[dialect])
+        current = schema_version(conn)
+        for migration in MIGRATIONS:
+            if migration.version <= current:
+                continue
+            for statement in migration.statements[dialect]:
+                if callable(statement):
+                    statement(cursor)
+                else:
+                    cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                           (migration.version, migration.name))
+            applied.append(migration.version)
+            print(f"Applied schema migration {migration.version}: {migration.name}")
+        conn.commit()
+    return applied
@@ -1,105 +1,85 @@
 import os
-import random
+import time
 import pandas as pd
-import numpy as np
 from stable_baselines3 import DQN
-from stable_baselines3.common.env_util import make_vec_env
-from gymnasium import Env, spaces
-
-# DEBUG: Show working directory
-print("Current working directory:", os.getcwd())
-
-# Load dataset
-relative_path = os.path.join("QuizBackend", "data", "Python_MCQ.csv")
-absolute_path = "/Users/kusalmadurayapa/Desktop/pythonQuiz/QuizBackend/data/Python_MCQ.csv"
-dataset_path = relative_path if os.path.exists(relative_path) else absolute_path
+from model_registry import save_bank_fingerprint
+from question_bank import QuestionBank
+from quiz_env import make_quiz_vec_env
+from preprocess import BANK_PATH, CSV_PATH, preprocess
+
+# Parallel learners simulated per training step. TRAIN_VEC_MODE picks the
+# vectorization: "batched" (NumPy, one process), "subproc" (one process per
+# env) or "dummy" (the old single-process loop). Gradient steps scale with
+# the env count (see build_model), so more envs collect faster without
+# training less.
+N_ENVS = int(os.getenv("TRAIN_N_ENVS", 8))
+VEC_MODE = os.getenv("TRAIN_VEC_MODE", "batched")
+TOTAL_TIMESTEPS = int(os.getenv("TRAIN_TIMESTEPS", 10000))
+SEED = int(os.environ["TRAIN_SEED"]) if os.getenv("TRAIN_SEED") else None
+# DQN settings of a plain run; train_sweep.py searches around them
+DEFAULT_HYPERPARAMS = {"learning_rate": 1e-4, "buffer_size": 10000, "batch_size": 64, "gamma": 0.99}
+
+
+def load_dataset(csv_path=CSV_PATH, bank_path=BANK_PATH):
+    # Load dataset
+    relative_path = os.path.join("QuizBackend", "data", "Python_MCQ.csv")
+    absolute_path = "/Users/kusalmadurayapa/Desktop/pythonQuiz/QuizBackend/data/Python_MCQ.csv"
+    dataset_path = relative_path if os.path.exists(relative_path) else absolute_path
+
+    if not os.path.exists(dataset_path):
+        print("ERROR: Dataset file not found at:", dataset_path)
+        exit(1)
 
-if os.path.exists(dataset_path):
+    # Streams the source into the preprocessed CSV and the binary bank the
+    # API server memory-maps at startup
     try:
-        dataset = pd.read_csv(dataset_path, encoding='ISO-8859-1')
+        stats = preprocess(dataset_path, csv_path, bank_path)
     except Exception as e:
-        print("ERROR reading dataset:", e)
+        print("ERROR preprocessing dataset:", e)
         exit(1)
-else:
-    print("ERROR: Dataset file not found at:", dataset_path)
-    exit(1)
-
-if dataset.empty:
-    print("ERROR: Dataset is empty. Please provide a valid dataset.")
-    exit(1)
-
-print("✅ Dataset loaded successfully. First few rows:")
-print(dataset.head())
-
-# Check for Difficulty column
-if "Difficulty" not in dataset.columns:
-    print("ERROR: 'Difficulty' column not found in dataset.")
-    exit(1)
-
-print("Unique values in 'Difficulty' column before processing:")
-print(dataset["Difficulty"].unique())
-
-# Convert difficulty levels to numeric values
-difficulty_mapping = {"Easy": 1, "Medium": 2, "Hard": 3}
-dataset["Difficulty"] = dataset["Difficulty"].map(difficulty_mapping).fillna(1).astype(int)
-
-dataset.reset_index(drop=True, inplace=True)
-
-print("✅ Difficulty column after conversion:")
-print(dataset["Difficulty"].unique())
-
-if len(dataset) == 0:
-    print("ERROR: No valid questions found in the dataset after preprocessing.")
-    exit(1)
-
-# Save the preprocessed dataset
-preprocessed_dataset_path = os.path.join("QuizBackend", "data", "preprocessed_dataset.csv")
-dataset.to_csv(preprocessed_dataset_path, index=False)
-print(f"✅ Preprocessed dataset saved at {preprocessed_dataset_path}")
-
-# Define custom Quiz environment
-class QuizEnvironment(Env):
-    def __init__(self, dataset):
-        super().__init__()
-        self.dataset = dataset
-        self.user_knowledge = 0.5
-        self.asked_questions = set()
-
-        self.action_space = spaces.Discrete(len(dataset))
-        self.observation_space = spaces.Box(low=0.0, high=1.0, shape=(1,), dtype=np.float32)
-        self.state = np.array([self.user_knowledge], dtype=np.float32)
-
-    def step(self, action):
-        if action in self.asked_questions:
-            return self.state, -1.0, True, False, {}
-
-        self.asked_questions.add(action)
-        question = self.dataset.iloc[action]
-        difficulty = question["Difficulty"]
-        is_correct = random.random() < self.user_knowledge
-
-        reward = difficulty if is_correct else -difficulty
-        self.user_knowledge += 0.1 * reward
-        self.user_knowledge = np.clip(self.user_knowledge, 0.0, 1.0)
-        self.state = np.array([self.user_knowledge], dtype=np.float32)
-        done = len(self.asked_questions) >= 20
-
-        return self.state, reward, done, False, {}
-
-    def reset(self, seed=None, options=None):
-        self.user_knowledge = 0.5
-        self.asked_questions.clear()
-        self.state = np.array([self.user_knowledge], dtype=np.float32)
-        return self.state, {}
-
-# Train the DQN Model
-env = make_vec_env(lambda: QuizEnvironment(dataset), n_envs=1)
-model = DQN('MlpPolicy', env, learning_rate=1e-4, buffer_size=10000, batch_size=64, gamma=0.99, verbose=1)
-
-print("🚀 Training model...")
-model.learn(total_timesteps=10000)
-
-# Save the model
-model_path = os.path.join("QuizBackend", "data", "quiz_model.zip")
-model.save(model_path)
-print(f"✅ Model saved at {model_path}")
+    print(f"✅ Preprocessed {stats.rows} rows: {stats.kept} questions kept, {stats.duplicates} duplicates dropped, "
+          f"{stats.missing_text} invalid rows rejected, {stats.unknown_difficulty} unknown difficulties set to 1")
+    print(f"✅ Preprocessed dataset saved at {csv_path}")
+    print(f"✅ Question bank exported to {bank_path}")
+
+    dataset = pd.read_csv(csv_path)
+    print("✅ Dataset loaded successfully. First few rows:")
+    print(dataset.head())
+    return dataset
+
+
+def build_model(env, hyperparams=None, seed=None, verbose=1):
+    # DQN's train_freq counts vectorized steps, each of which collects
+    # num_envs transitions; one gradient step per env keeps the updates per
+    # collected transition what a single env gets
+    params = {"gradient_steps": env.num_envs, **DEFAULT_HYPERPARAMS, **(hyperparams or {})}
+    return DQN('MlpPolicy', env, **params, verbose=verbose, seed=seed)
+
+
+def train(dataset):
+    # Train the DQN Model
+    env = make_quiz_vec_env(dataset, n_envs=N_ENVS, mode=VEC_MODE, seed=SEED)
+    model = build_model(env, seed=SEED)
+
+    print(f"🚀 Training model ({N_ENVS} envs, {VEC_MODE})...")
+    started = time.perf_counter()
+    model.learn(total_timesteps=TOTAL_TIMESTEPS)
+    elapsed = time.perf_counter() - started
+    print(f"Trained {TOTAL_TIMESTEPS} steps in {elapsed:.1f}s ({TOTAL_TIMESTEPS / elapsed:.0f} steps/s)")
+    env.close()
+    return model
+
+
+# SubprocVecEnv re-imports this module in each worker, so nothing may run at import time
+if __name__ == "__main__":
+    # DEBUG: Show working directory
+    print("Current working directory:", os.getcwd())
+
+    dataset = load_dataset()
+    model = train(dataset)
+
+    # Save the model, with the fingerprint of the bank its action ids index
+    model_path = os.path.join("QuizBackend", "data", "quiz_model.zip")
+    model.save(model_path)
+    save_bank_fingerprint(model_path, QuestionBank.from_dataframe(dataset))
+    print(f"✅ Model saved at {model_path}")
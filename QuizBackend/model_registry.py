@@ -0,0 +1,312 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from bank_file import load_bank, write_bank
+from distractors import DistractorPool
+from question_bank import QuestionBank
+
+# Versioned registry for the DQN model and the question bank it serves.
+# Requests pin the active Snapshot with acquire(); a background thread watches
+# the model and dataset files, loads whichever changed into a new Snapshot and
+# swaps it in atomically. A replaced snapshot is retired (its model released)
+# once the last request holding it finishes, so no request ever waits on a load.
+# pandas, torch and stable_baselines3 are only imported when something needs
+# them; the first model load runs on the watcher thread after startup.
+#
+# A DQN's action ids are row positions in the bank it was trained on, so a
+# model only serves alongside that same bank. Training writes the bank's
+# fingerprint (QuestionBank.fingerprint) next to the model; a snapshot whose
+# bank does not match it, or a model without one, keeps the model loaded but
+# serves the heuristic policy (snapshot.model is None) until a matching
+# model or bank is swapped in.
+
+# Seconds between checks of the model and dataset files
+DEFAULT_POLL_INTERVAL = 5.0
+# Replaced banks kept so quizzes started on them can translate question ids
+BANK_HISTORY = 4
+
+
+def load_question_bank(path):
+    # .qbank files are memory-mapped; anything else is read as the preprocessed CSV
+    if path.endswith(".qbank"):
+        return load_bank(path)
+    import pandas as pd
+
+    return QuestionBank.from_dataframe(pd.read_csv(path))
+
+
+def rebuild_bank_if_stale(bank_path, source_path):
+    # Rewrites the .qbank from the preprocessed CSV it is exported from when
+    # the CSV is newer (or the .qbank is missing), so a CSV dropped in place
+    # is served instead of the old export. Returns True when it rebuilt.
+    source = file_signature(source_path)
+    if source is None:
+        return False
+    exported = file_signature(bank_path)
+    if exported is not None and exported[0] >= source[0]:
+        return False
+    import pandas as pd
+
+    bank = QuestionBank.from_dataframe(pd.read_csv(source_path))
+    if not len(bank):
+        # Most likely a CSV still being copied in; keep serving the old bank
+        raise ValueError(f"No questions in {source_path}")
+    write_bank(bank, bank_path)
+    print(f"Question bank rebuilt from {source_path}")
+    return True
+
+
+def load_model(path):
+    from stable_baselines3 import DQN
+
+    return DQN.load(path)
+
+
+def bank_fingerprint_path(model_path):
+    # quiz_model.zip -> quiz_model.bank.json
+    return os.path.splitext(model_path)[0] + ".bank.json"
+
+
+def save_bank_fingerprint(model_path, bank):
+    # Records the bank a model was trained on; call whenever a model is saved
+    path = bank_fingerprint_path(model_path)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(bank.fingerprint(), f)
+    os.replace(temp_path, path)
+
+
+def read_bank_fingerprint(model_path):
+    try:
+        with open(bank_fingerprint_path(model_path)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class Snapshot:
+    def __init__(self, version, model, model_version, bank, bank_version, distractors, signatures, load_seconds,
+                 model_bank=None, bank_fingerprint=None):
+        self.version = version
+        # The policy to serve: the loaded model only when it was trained on this bank
+        self.loaded_model = model
+        self.model_bank = model_bank
+        self.bank_fingerprint = bank_fingerprint
+        self.model = model if model is not None and model_bank is not None and model_bank == bank_fingerprint else None
+        self.model_version = model_version
+        self.bank = bank
+        self.bank_version = bank_version
+        self.distractors = distractors
+        self.signatures = signatures
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.refs = 0
+        self.retired = False
+
+    def describe(self):
+        return {
+            "version": self.version,
+            "model_version": self.model_version,
+            "model_loaded": self.loaded_model is not None,
+            "model_matches_bank": self.model is not None,
+            "bank_version": self.bank_version,
+            "bank_size": len(self.bank),
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "in_flight": self.refs,
+        }
+
+
+class ModelRegistry:
+    def __init__(self, model_path, dataset_path, poll_interval=DEFAULT_POLL_INTERVAL, load_model=True, source_path=None):
+        self.model_path = model_path
+        self.dataset_path = dataset_path
+        # CSV a .qbank dataset is exported from, watched as well (see rebuild_bank_if_stale)
+        self.source_path = source_path
+        self.poll_interval = poll_interval
+        # False when nothing serves the policy, so the ML stack is never imported
+        self.load_model = load_model
+        self._lock = threading.Lock()
+        # Serializes loads between the watcher and explicit reloads
+        self._load_lock = threading.Lock()
+        self._active = None
+        self._retiring = {}
+        self._banks = OrderedDict()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.last_error = None
+
+    def start(self):
+        # Only the bank loads at startup; the model and later versions load in the background
+        self.reload(defer_model=True)
+        self._thread = threading.Thread(target=self._run, name="model-registry", daemon=True)
+        self._thread.start()
+        if self.load_model:
+            self._wakeup.set()
+
+    def close(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(5.0)
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            snapshot = self._active
+            snapshot.refs += 1
+        try:
+            yield snapshot
+        finally:
+            with self._lock:
+                snapshot.refs -= 1
+                if snapshot.retired and snapshot.refs == 0:
+                    self._retiring.pop(snapshot.version, None)
+
+    def request_reload(self):
+        # Wake the watcher now instead of at the next poll
+        self._wakeup.set()
+
+    def _signatures(self, defer_model=False):
+        # A model that is not (yet) wanted has no signature, so it loads once it is
+        wanted = self.load_model and not defer_model
+        return {
+            "model": file_signature(self.model_path) if wanted else None,
+            "model_bank": file_signature(bank_fingerprint_path(self.model_path)) if wanted else None,
+            "dataset": file_signature(self.dataset_path),
+        }
+
+    def reload(self, defer_model=False):
+        # Load changed files into a new snapshot and swap it in. Returns True on a swap.
+        with self._load_lock:
+            current = self._active
+            if self.source_path is not None:
+                try:
+                    rebuild_bank_if_stale(self.dataset_path, self.source_path)
+                except Exception as e:
+                    if current is None and file_signature(self.dataset_path) is None:
+                        raise
+                    # Serve the existing export; the next poll retries
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    print("Question bank rebuild failed:", self.last_error)
+            signatures = self._signatures(defer_model)
+            if current is not None and signatures == current.signatures:
+                return False
+
+            load_seconds = {}
+            try:
+                if current is None or signatures["model"] != current.signatures["model"]:
+                    model = None
+                    if signatures["model"]:
+                        started = time.perf_counter()
+                        model = load_model(self.model_path)
+                        load_seconds["model"] = round(time.perf_counter() - started, 4)
+                    model_version = (current.model_version + 1) if current else int(model is not None)
+                else:
+                    model, model_version = current.loaded_model, current.model_version
+
+                if current is None or signatures["model_bank"] != current.signatures["model_bank"]:
+                    model_bank = read_bank_fingerprint(self.model_path) if signatures["model_bank"] else None
+                else:
+                    model_bank = current.model_bank
+
+                if current is None or signatures["dataset"] != current.signatures["dataset"]:
+                    started = time.perf_counter()
+                    bank = load_question_bank(self.dataset_path) if signatures["dataset"] else QuestionBank([], [], [], [])
+                    distractors = DistractorPool.from_bank(bank)
+                    load_seconds["bank"] = round(time.perf_counter() - started, 4)
+                    bank_version = (current.bank_version + 1) if current else 1
+                else:
+                    bank, distractors, bank_version = current.bank, current.distractors, current.bank_version
+
+                # Only needed to check a model against the bank, and kept per bank
+                bank_fingerprint = current.bank_fingerprint if current is not None and bank is current.bank else None
+                if model is not None and bank_fingerprint is None:
+                    bank_fingerprint = bank.fingerprint()
+
+                # A file still being written changes under us; pick it up next poll.
+                # Replacing files with an atomic rename avoids the wait.
+                if self._signatures(defer_model) != signatures:
+                    return False
+            except Exception as e:
+                if current is None:
+                    raise
+                # Keep serving the active version; the next poll retries
+                self.last_error = f"{type(e).__name__}: {e}"
+                print("Model registry reload failed:", self.last_error)
+                return False
+
+            version = (current.version + 1) if current else 1
+            snapshot = Snapshot(version, model, model_version, bank, bank_version, distractors, signatures, load_seconds,
+                                model_bank, bank_fingerprint)
+            if model is not None and snapshot.model is None:
+                print(f"Model {self.model_path} was not trained on the active question bank "
+                      f"(model: {model_bank or 'no fingerprint'}, bank: {bank_fingerprint}); "
+                      f"serving the heuristic policy until they match")
+            self._swap(snapshot)
+            self.last_error = None
+            return True
+
+    def bank(self, bank_version):
+        # Active or recently replaced bank by version, None once dropped
+        with self._lock:
+            return self._banks.get(bank_version)
+
+    def translate(self, question_ids, from_version, to_bank):
+        # Map ids from an older bank onto `to_bank` by question text; ids whose
+        # question is gone are dropped
+        old_bank = self.bank(from_version)
+        if old_bank is None:
+            return []
+        translated = []
+        for question_id in question_ids:
+            new_id = to_bank.find(old_bank.questions[question_id]) if question_id < len(old_bank) else None
+            if new_id is not None:
+                translated.append(new_id)
+        return translated
+
+    def status(self):
+        with self._lock:
+            return {
+                "active": self._active.describe() if self._active else None,
+                "retiring": [snapshot.describe() for snapshot in self._retiring.values()],
+                "model_path": self.model_path,
+                "dataset_path": self.dataset_path,
+                "source_path": self.source_path,
+                "poll_interval": self.poll_interval,
+                "last_error": self.last_error,
+            }
+
+    def _swap(self, snapshot):
+        with self._lock:
+            previous = self._active
+            self._active = snapshot
+            self._banks[snapshot.bank_version] = snapshot.bank
+            self._banks.move_to_end(snapshot.bank_version)
+            while len(self._banks) > BANK_HISTORY:
+                self._banks.popitem(last=False)
+            if previous is not None:
+                previous.retired = True
+                if previous.refs:
+                    self._retiring[previous.version] = previous
+
+    def _run(self):
+        while not self._stopping.is_set():
+            # poll_interval 0 turns polling off; request_reload() still works
+            self._wakeup.wait(self.poll_interval or None)
+            self._wakeup.clear()
+            if not self._stopping.is_set():
+                self.reload()
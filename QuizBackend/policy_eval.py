@@ -0,0 +1,278 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from model_registry import load_model, load_question_bank
+
+# Offline evaluation of question-selection policies against the answers
+# logged in the Question table. From the repository root:
+#   python QuizBackend/policy_eval.py --sessions 10000 --length 20 --policies heuristic,random,dqn
+# reads the database configured in .env (DB_BACKEND etc.), then:
+#   1. streams every logged answer, resolving its question in the bank for
+#      difficulty and category, and estimates each logged quiz's learner
+#      ability as its smoothed accuracy;
+#   2. fits P(correct | ability bin, difficulty, category), each level
+#      shrunk towards the coarser one above it when its counts are thin;
+#   3. replays --sessions simulated learners (abilities drawn from the
+#      logged ones) through each policy at once as NumPy arrays, applying
+#      the same knowledge and score updates as submit_answer.
+# Reported per quiz length: answer accuracy so far, how far the quiz's
+# knowledge level is from the learner's ability (lower means the quiz
+# has measured the learner), mean difficulty served and score.
+
+ABILITY_BINS = 10
+# Pseudo-counts pulling a sparse cell towards its parent estimate
+PRIOR_STRENGTH = 5.0
+INITIAL_KNOWLEDGE = 0.5
+KNOWLEDGE_STEP = 0.1
+HEURISTIC_K = 5
+REPORT_LENGTHS = (1, 5, 10, 15, 20, 30, 50)
+
+
+class ResponseModel:
+    def __init__(self, table, abilities, answers, skipped):
+        # table[ability bin, difficulty level, category code] -> P(correct)
+        self.table = table
+        self.abilities = abilities
+        self.answers = answers
+        self.skipped = skipped
+
+    @classmethod
+    def fit(cls, answers, bank):
+        # answers: iterable of (quiz_id, description, is_correct)
+        quiz_index = {}
+        quizzes, levels, categories, correct = [], [], [], []
+        resolved = {}
+        skipped = 0
+        for quiz_id, description, is_correct in answers:
+            question_id = resolved.get(description, -2)
+            if question_id == -2:
+                question_id = bank.find(description)
+                resolved[description] = question_id if question_id is not None else -1
+                question_id = resolved[description]
+            if question_id < 0:
+                skipped += 1
+                continue
+            quizzes.append(quiz_index.setdefault(quiz_id, len(quiz_index)))
+            levels.append(bank.difficulty[question_id])
+            categories.append(bank.category[question_id])
+            correct.append(1 if is_correct else 0)
+        if not quizzes:
+            raise ValueError("No logged answers match the question bank")
+
+        quizzes = np.array(quizzes)
+        levels = np.array(levels, dtype=np.int64)
+        categories = np.array(categories, dtype=np.int64)
+        correct = np.array(correct, dtype=np.float64)
+
+        # Ability: the learner's accuracy over the whole quiz, smoothed
+        # towards one half so short quizzes do not land on 0 or 1
+        quiz_correct = np.bincount(quizzes, weights=correct)
+        quiz_total = np.bincount(quizzes)
+        abilities = (quiz_correct + 1) / (quiz_total + 2)
+        bins = np.minimum((abilities[quizzes] * ABILITY_BINS).astype(np.int64), ABILITY_BINS - 1)
+
+        n_levels = int(max(levels.max(), max(bank.difficulty))) + 1
+        n_categories = max(len(bank.category_names), 1)
+        overall = correct.mean()
+
+        def rate(index, size, prior):
+            hits = np.bincount(index, weights=correct, minlength=size)
+            total = np.bincount(index, minlength=size)
+            return (hits + PRIOR_STRENGTH * prior) / (total + PRIOR_STRENGTH)
+
+        by_bin = rate(bins, ABILITY_BINS, overall)
+        by_level = rate(bins * n_levels + levels, ABILITY_BINS * n_levels,
+                        np.repeat(by_bin, n_levels)).reshape(ABILITY_BINS, n_levels)
+        table = rate((bins * n_levels + levels) * n_categories + categories, ABILITY_BINS * n_levels * n_categories,
+                     np.repeat(by_level.ravel(), n_categories)).reshape(ABILITY_BINS, n_levels, n_categories)
+        return cls(table, abilities, len(quizzes), skipped)
+
+
+class AskedIds:
+    # The ids each simulated session has asked, in order: (sessions, length),
+    # -1 past the current step. A quiz asks at most `length` questions, so
+    # this stays small however large the bank is.
+    def __init__(self, sessions, length):
+        self.ids = np.full((sessions, length), -1, dtype=np.int64)
+        self.count = 0
+
+    def add(self, actions):
+        self.ids[:, self.count] = actions
+        self.count += 1
+
+    def contains(self, rows, picks):
+        # Whether session rows[i] has asked picks[i]
+        return (self.ids[rows, :self.count] == picks[:, None]).any(axis=1)
+
+    def of(self, row):
+        return self.ids[row, :self.count]
+
+
+class Simulator:
+    def __init__(self, bank, responses):
+        self.size = len(bank)
+        self.difficulty = np.asarray(bank.difficulty, dtype=np.int64)
+        self.category = np.asarray(bank.category, dtype=np.int64)
+        self.levels = np.array(sorted(set(self.difficulty.tolist())))
+        self.level_ids = {int(level): np.flatnonzero(self.difficulty == level) for level in self.levels}
+        self.responses = responses
+
+    def run(self, policy, sessions, length, seed=0):
+        rng = np.random.default_rng(seed)
+        length = min(length, self.size)
+        rows = np.arange(sessions)
+        ability = rng.choice(self.responses.abilities, size=sessions)
+        ability_bin = np.minimum((ability * ABILITY_BINS).astype(np.int64), ABILITY_BINS - 1)
+        knowledge = np.full(sessions, INITIAL_KNOWLEDGE)
+        score = np.zeros(sessions)
+        correct_so_far = np.zeros(sessions)
+        asked = AskedIds(sessions, length)
+
+        curve = []
+        for step in range(length):
+            actions = policy(self, knowledge, asked, step, rng)
+            levels = self.difficulty[actions]
+            p_correct = self.responses.table[ability_bin, levels, self.category[actions]]
+            correct = rng.random(sessions) < p_correct
+
+            # submit_answer's updates
+            knowledge = np.clip(knowledge + np.where(correct, KNOWLEDGE_STEP, -KNOWLEDGE_STEP), 0.0, 1.0)
+            score += np.where(correct, levels, -0.5 * levels)
+            correct_so_far += correct
+            asked.add(actions)
+
+            curve.append({
+                "length": step + 1,
+                "accuracy": round(float(correct_so_far.mean() / (step + 1)), 4),
+                "knowledge_error": round(float(np.abs(knowledge - ability).mean()), 4),
+                "mean_difficulty": round(float(levels.mean()), 4),
+                "score": round(float(score.mean()), 4),
+            })
+        return curve
+
+    def unasked_random(self, asked, rows, rng, candidates=None):
+        # One random unasked id per row, from `candidates` when given
+        pool = np.arange(self.size) if candidates is None else candidates
+        picks = pool[rng.integers(len(pool), size=len(rows))]
+        clash = asked.contains(rows, picks)
+        for _ in range(32):
+            if not clash.any():
+                return picks
+            picks[clash] = pool[rng.integers(len(pool), size=int(clash.sum()))]
+            clash = asked.contains(rows, picks)
+        # Nearly exhausted pool: draw from each clashing row's free ids
+        for index in np.flatnonzero(clash):
+            taken = asked.of(rows[index])
+            free = pool[~np.isin(pool, taken)]
+            if len(free) == 0:
+                free = np.setdiff1d(np.arange(self.size), taken)
+            picks[index] = rng.choice(free)
+        return picks
+
+
+def random_policy(sim, knowledge, asked, step, rng):
+    return sim.unasked_random(asked, np.arange(len(knowledge)), rng)
+
+
+def heuristic_policy(sim, knowledge, asked, step, rng):
+    # next_question's fallback: any question first, then one near
+    # knowledge * 3 in difficulty. QuestionBank.pick chooses among the k
+    # nearest unasked ids, which all come from the nearest level unless it
+    # has fewer than k left; that is the case modelled here.
+    rows = np.arange(len(knowledge))
+    if step == 0:
+        return sim.unasked_random(asked, rows, rng)
+    target = knowledge * 3
+    nearest = sim.levels[np.argmin(np.abs(sim.levels[None, :] - target[:, None]), axis=1)]
+    actions = np.empty(len(knowledge), dtype=np.int64)
+    for level in np.unique(nearest):
+        chosen = rows[nearest == level]
+        actions[chosen] = sim.unasked_random(asked, chosen, rng, sim.level_ids[int(level)])
+    return actions
+
+
+def dqn_policy_from(model_path):
+    model = load_model(model_path)
+
+    def dqn_policy(sim, knowledge, asked, step, rng):
+        # PolicyServer's choice (best Q-value not asked yet) for every session.
+        # Q-values depend only on the knowledge level, which takes a handful
+        # of values, so the forward pass and ranking run once per level.
+        # A session has asked asked.count ids, so one of its level's top
+        # asked.count + 1 ids is free; no sessions x bank array is built.
+        import torch
+
+        levels, level_of = np.unique(knowledge, return_inverse=True)
+        with torch.no_grad():
+            q_values = model.q_net(torch.as_tensor(levels[:, None], dtype=torch.float32, device=model.device)).cpu().numpy()
+        num_actions = q_values.shape[1]
+        if num_actions < sim.size:
+            raise ValueError(f"Model has {num_actions} actions for a bank of {sim.size} questions")
+        # Stable, so ties go to the lowest id as with argmax
+        ranked = np.argsort(-q_values[:, :sim.size], axis=1, kind="stable")[:, :asked.count + 1]
+        candidates = ranked[level_of]
+        taken = (candidates[:, :, None] == asked.ids[:, None, :asked.count]).any(axis=2)
+        return candidates[np.arange(len(knowledge)), taken.argmin(axis=1)]
+
+    return dqn_policy
+
+
+def print_curves(results, lengths):
+    print(f"{'policy':<11}{'length':>7}{'accuracy':>10}{'know err':>10}{'difficulty':>12}{'score':>9}")
+    for name, curve in results.items():
+        for point in curve:
+            if point["length"] in lengths or point["length"] == len(curve):
+                print(f"{name:<11}{point['length']:>7}{point['accuracy']:>10.3f}{point['knowledge_error']:>10.3f}"
+                      f"{point['mean_difficulty']:>12.2f}{point['score']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate question-selection policies offline on logged answers.")
+    parser.add_argument("--policies", default="heuristic,random", help="comma-separated: heuristic, random, dqn")
+    parser.add_argument("--sessions", type=int, default=10000, help="simulated quizzes per policy")
+    parser.add_argument("--length", type=int, default=20, help="questions per simulated quiz")
+    parser.add_argument("--bank", default=os.getenv("QUIZ_DATASET_PATH", "QuizBackend/data/question_bank.qbank"))
+    parser.add_argument("--model", default=os.getenv("QUIZ_MODEL_PATH", "QuizBackend/data/quiz_model.zip"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the curves as JSON to this path")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+
+    from storage import QuizRepository, backend_from_env
+
+    load_dotenv()
+    bank = load_question_bank(args.bank)
+    repository = QuizRepository(backend_from_env(), leaderboard_refresh=0)
+
+    started = time.perf_counter()
+    try:
+        responses = ResponseModel.fit(repository.stream_answers(), bank)
+    except ValueError as e:
+        sys.exit(str(e))
+    print(f"Fitted responses from {responses.answers} logged answers over {len(responses.abilities)} quizzes "
+          f"({responses.skipped} not in the bank) in {time.perf_counter() - started:.2f}s")
+
+    policies = {"heuristic": heuristic_policy, "random": random_policy}
+    simulator = Simulator(bank, responses)
+    results = {}
+    for name in args.policies.split(","):
+        policy = dqn_policy_from(args.model) if name == "dqn" else policies[name]
+        started = time.perf_counter()
+        results[name] = simulator.run(policy, args.sessions, args.length, seed=args.seed)
+        print(f"{name}: {args.sessions} sessions x {args.length} questions in {time.perf_counter() - started:.2f}s")
+
+    print_curves(results, REPORT_LENGTHS)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"config": vars(args), "answers": responses.answers, "curves": results}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
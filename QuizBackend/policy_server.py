@@ -0,0 +1,104 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from instrumentation import span
+
+# DQN policy serving for /api/next_question (QUESTION_POLICY=dqn).
+# Requests submit (model, knowledge level, asked ids) and wait on a Future; a
+# worker thread gathers up to `max_batch` requests, waiting at most `max_wait`
+# seconds after the first one, and answers them with one forward pass per model
+# (requests pinned to different registry versions are never mixed).
+# Already-asked questions are masked out of the Q-values before the argmax.
+
+DEFAULT_MAX_BATCH = 32
+# Seconds the worker holds the first request open for others to join
+DEFAULT_MAX_WAIT = 0.002
+# Seconds a request waits for its answer before the route falls back
+DEFAULT_RESULT_TIMEOUT = 1.0
+
+
+class PolicyServer:
+    def __init__(self, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT, result_timeout=DEFAULT_RESULT_TIMEOUT):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.result_timeout = result_timeout
+        self._queue = queue.Queue()
+        self._stopping = threading.Event()
+        self.requests = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="policy-server", daemon=True)
+        self._thread.start()
+
+    def select(self, model, knowledge_level, asked_ids, bank_size):
+        # Best unasked question id for this learner, None when all are masked.
+        # Ids beyond the bank (the model was trained on a larger one) are masked too.
+        future = Future()
+        with span("inference"):
+            self._queue.put((model, knowledge_level, asked_ids, bank_size, future))
+            return future.result(timeout=self.result_timeout)
+
+    def close(self, timeout=5.0):
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "avg_batch": self.requests / self.batches if self.batches else 0.0,
+        }
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            by_model = {}
+            for item in batch:
+                by_model.setdefault(id(item[0]), []).append(item)
+            for group in by_model.values():
+                try:
+                    choices = self._forward(group[0][0], group)
+                except Exception as e:
+                    for *_, future in group:
+                        future.set_exception(e)
+                    continue
+                for (*_, future), choice in zip(group, choices):
+                    future.set_result(choice)
+
+    def _forward(self, model, batch):
+        # The model already loaded numpy and torch; importing them here keeps them off the startup path
+        import numpy as np
+        import torch
+
+        num_actions = int(model.action_space.n)
+        obs = np.array([[knowledge] for _, knowledge, *_ in batch], dtype=np.float32)
+
+        with torch.no_grad():
+            q_values = model.q_net(torch.as_tensor(obs, device=model.device)).cpu().numpy()
+
+        for row, (_, _, asked_ids, bank_size, _) in enumerate(batch):
+            if asked_ids:
+                q_values[row, [i for i in asked_ids if i < num_actions]] = -np.inf
+            if bank_size < num_actions:
+                q_values[row, bank_size:] = -np.inf
+
+        choices = q_values.argmax(axis=1)
+        self.requests += len(batch)
+        self.batches += 1
+        return [int(choice) if np.isfinite(q_values[row, choice]) else None for row, choice in enumerate(choices)]
@@ -0,0 +1,143 @@
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+from bank_file import BankWriter
+
+# Streaming preprocessing stage: raw question CSV in, the training CSV and
+# the .qbank serving artifact out. From the repository root:
+#   python QuizBackend/preprocess.py [--source Python_MCQ.csv] [--chunk-size 50000]
+# The source is read --chunk-size rows at a time with Category and
+# Difficulty as categoricals and the text columns as strings. Per chunk:
+#   - rows without a question or an answer are rejected, a missing
+#     category becomes "Unknown";
+#   - Difficulty (Easy/Medium/Hard or 1/2/3) becomes its level, anything
+#     else level 1 as before, counted in the report;
+#   - a question whose exact text was already kept is dropped;
+# and the kept rows are appended to the CSV and the bank. Memory is one
+# chunk plus about 30 bytes per kept question (the bank's fixed-size
+# columns and the dedupe index); question text goes to disk as it arrives.
+
+DATA_DIR = os.path.join("QuizBackend", "data")
+SOURCE_PATH = os.path.join(DATA_DIR, "Python_MCQ.csv")
+CSV_PATH = os.path.join(DATA_DIR, "preprocessed_dataset.csv")
+BANK_PATH = os.path.join(DATA_DIR, "question_bank.qbank")
+# Python_MCQ.csv is UTF-8; read as ISO-8859-1 (the old default) its
+# non-ASCII characters came out as mojibake
+SOURCE_ENCODING = "utf-8"
+DEFAULT_CHUNK_SIZE = 50000
+
+REQUIRED_COLUMNS = ("Question", "Correct Answer", "Difficulty")
+DTYPES = {"Question": "string", "Correct Answer": "string", "Difficulty": "category", "Category": "category"}
+DIFFICULTY_LEVELS = {"easy": 1, "medium": 2, "hard": 3, "1": 1, "2": 2, "3": 3}
+DEFAULT_LEVEL = 1
+UNKNOWN_CATEGORY = "Unknown"
+
+
+class PreprocessStats:
+    def __init__(self):
+        self.rows = 0
+        self.kept = 0
+        self.duplicates = 0
+        self.missing_text = 0
+        self.missing_category = 0
+        self.unknown_difficulty = 0
+        self.chunks = 0
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def _levels(difficulty):
+    # Map the chunk's (few) categories once instead of every row
+    codes = {category: DIFFICULTY_LEVELS.get(str(category).strip().lower()) for category in difficulty.cat.categories}
+    levels = difficulty.map(codes).astype("float")
+    unknown = levels.isna()
+    return levels.fillna(DEFAULT_LEVEL).astype("int8"), int(unknown.sum())
+
+
+def preprocess(source_path=SOURCE_PATH, csv_path=CSV_PATH, bank_path=BANK_PATH,
+               chunk_size=DEFAULT_CHUNK_SIZE, encoding=SOURCE_ENCODING):
+    stats = PreprocessStats()
+    header = pd.read_csv(source_path, encoding=encoding, nrows=0).columns
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"{source_path} has no {', '.join(repr(column) for column in missing)} column")
+
+    writer = BankWriter(bank_path, dedupe=True)
+    temp_csv = f"{csv_path}.tmp"
+    try:
+        reader = pd.read_csv(source_path, encoding=encoding, chunksize=chunk_size,
+                             dtype={column: dtype for column, dtype in DTYPES.items() if column in header})
+        with open(temp_csv, "w", encoding="utf-8", newline="") as out:
+            for chunk in reader:
+                stats.chunks += 1
+                stats.rows += len(chunk)
+
+                text_ok = chunk["Question"].str.strip().fillna("").ne("") & chunk["Correct Answer"].notna()
+                stats.missing_text += int((~text_ok).sum())
+                chunk = chunk[text_ok]
+
+                if "Category" in chunk.columns:
+                    category = chunk["Category"]
+                    stats.missing_category += int(category.isna().sum())
+                    if UNKNOWN_CATEGORY not in category.cat.categories:
+                        category = category.cat.add_categories(UNKNOWN_CATEGORY)
+                    chunk = chunk.assign(Category=category.fillna(UNKNOWN_CATEGORY))
+                levels, unknown = _levels(chunk["Difficulty"])
+                stats.unknown_difficulty += unknown
+                chunk = chunk.assign(Difficulty=levels)
+
+                categories = chunk["Category"] if "Category" in chunk.columns else [UNKNOWN_CATEGORY] * len(chunk)
+                keep = [writer.add(question, answer, level, category)
+                        for question, answer, level, category
+                        in zip(chunk["Question"], chunk["Correct Answer"], chunk["Difficulty"], categories)]
+                kept = chunk[keep]
+                stats.duplicates += len(chunk) - len(kept)
+                if len(kept):
+                    kept.to_csv(out, index=False, header=stats.kept == 0)
+                    stats.kept += len(kept)
+
+        if stats.kept == 0:
+            raise ValueError(f"No valid questions in {source_path}")
+        writer.close()
+    except BaseException:
+        writer.abort()
+        if os.path.exists(temp_csv):
+            os.remove(temp_csv)
+        raise
+    # The bank is renamed into place first; the CSV follows, so the two
+    # only disagree if the process dies between the renames
+    os.replace(temp_csv, csv_path)
+    # ...and the bank is stamped after it, or the server would see a CSV newer
+    # than its bank and rebuild the bank from it (see rebuild_bank_if_stale)
+    os.utime(bank_path)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the training CSV and the question bank from the raw question CSV.")
+    parser.add_argument("--source", default=SOURCE_PATH)
+    parser.add_argument("--csv", default=CSV_PATH, help="preprocessed CSV for training")
+    parser.add_argument("--bank", default=BANK_PATH, help=".qbank file the API server maps")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--encoding", default=SOURCE_ENCODING)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        stats = preprocess(args.source, args.csv, args.bank, args.chunk_size, args.encoding)
+    except (OSError, ValueError) as e:
+        sys.exit(f"ERROR: {e}")
+    print(f"✅ {stats.kept} questions from {stats.rows} rows in {stats.chunks} chunks "
+          f"({time.perf_counter() - started:.2f}s): {stats.duplicates} duplicates, "
+          f"{stats.missing_text} without question or answer, {stats.missing_category} without category, "
+          f"{stats.unknown_difficulty} with unknown difficulty")
+    print(f"✅ Written {args.csv} and {args.bank}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import hashlib
+import random
+from array import array
+
+# In-memory question bank, built once at startup.
+# Question ids are row positions in the preprocessed dataset, so they stay
+# compatible with the ids already stored in session["questions_asked"].
+
+# Give up on random probing after this many hits on already-asked ids
+MAX_SAMPLE_PROBES = 32
+
+
+class AskedBitmap:
+    # Sparse bitmap of question ids already served in a session.
+    # Only the 64-bit words that hold a set bit are stored, so the cost is
+    # proportional to the number of asked questions, not to the bank size.
+    __slots__ = ("_words", "_count")
+
+    def __init__(self, ids=()):
+        self._words = {}
+        self._count = 0
+        for question_id in ids:
+            self.add(question_id)
+
+    def add(self, question_id):
+        word, bit = question_id >> 6, 1 << (question_id & 63)
+        current = self._words.get(word, 0)
+        if not current & bit:
+            self._words[word] = current | bit
+            self._count += 1
+
+    def __contains__(self, question_id):
+        return bool(self._words.get(question_id >> 6, 0) & (1 << (question_id & 63)))
+
+    def __len__(self):
+        return self._count
+
+
+class QuestionBank:
+    def __init__(self, questions, answers, difficulties, categories):
+        self.questions = list(questions)
+        self.answers = list(answers)
+        self.difficulty = array("b", (int(d) for d in difficulties))
+
+        # Category strings are interned into a small table and stored as codes
+        self.category_names = []
+        self._category_codes = {}
+        self.category = array("H")
+        for name in categories:
+            code = self._category_codes.get(name)
+            if code is None:
+                code = self._category_codes[name] = len(self.category_names)
+                self.category_names.append(name)
+            self.category.append(code)
+
+        # Row ids bucketed by difficulty and by (difficulty, category)
+        self._by_difficulty = {}
+        self._by_cell = {}
+        for question_id, (level, code) in enumerate(zip(self.difficulty, self.category)):
+            self._by_difficulty.setdefault(level, array("i")).append(question_id)
+            self._by_cell.setdefault((level, code), array("i")).append(question_id)
+        self.levels = sorted(self._by_difficulty)
+
+        # Hash index from question text to the first row with that text
+        self._by_text = {}
+        for question_id, text in enumerate(self.questions):
+            self._by_text.setdefault(text, question_id)
+
+    @classmethod
+    def from_parts(cls, questions, answers, difficulty, category, category_names, by_difficulty, by_cell, by_text):
+        # Bank over prebuilt columns and indexes, e.g. views into a mapped
+        # .qbank file (see bank_file.py); nothing is copied
+        bank = cls.__new__(cls)
+        bank.questions = questions
+        bank.answers = answers
+        bank.difficulty = difficulty
+        bank.category_names = category_names
+        bank._category_codes = {name: code for code, name in enumerate(category_names)}
+        bank.category = category
+        bank._by_difficulty = by_difficulty
+        bank._by_cell = by_cell
+        bank.levels = sorted(by_difficulty)
+        bank._by_text = by_text
+        return bank
+
+    @classmethod
+    def from_dataframe(cls, df):
+        if df.empty:
+            return cls([], [], [], [])
+        categories = df["Category"].tolist() if "Category" in df.columns else ["Unknown"] * len(df)
+        return cls(df["Question"].tolist(), df["Correct Answer"].tolist(), df["Difficulty"].tolist(), categories)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def fingerprint(self):
+        # Identifies the bank a DQN was trained on: its action ids are row
+        # positions, so equal texts in equal order mean equal questions
+        digest = hashlib.sha256()
+        for text in self.questions:
+            digest.update(str(text).encode("utf-8"))
+            digest.update(b"\0")
+        return {"size": len(self), "sha256": digest.hexdigest()}
+
+    def find(self, question_text):
+        return self._by_text.get(question_text)
+
+    def category_of(self, question_id):
+        return self.category_names[self.category[question_id]]
+
+    def row(self, question_id):
+        # Same keys as a dataset row so route code reads the same
+        return {
+            "Question": self.questions[question_id],
+            "Correct Answer": self.answers[question_id],
+            "Difficulty": self.difficulty[question_id],
+            "Category": self.category_of(question_id),
+        }
+
+    def sample_any(self, asked):
+        # Uniform pick over the questions not asked yet, None when exhausted
+        total = len(self.questions)
+        if len(asked) >= total:
+            return None
+        for _ in range(MAX_SAMPLE_PROBES):
+            question_id = random.randrange(total)
+            if question_id not in asked:
+                return question_id
+        picked = []
+        self._collect(range(total), asked, 1, picked)
+        return picked[0] if picked else None
+
+    def nearest(self, target_difficulty, asked, k=5, category=None):
+        # Up to k unasked question ids whose difficulty is closest to the target.
+        # Buckets are walked nearest level first, starting at a random offset,
+        # so only about k + len(asked) ids are touched.
+        code = None
+        if category is not None:
+            code = self._category_codes.get(category)
+            if code is None:
+                return []
+
+        picked = []
+        for level in sorted(self.levels, key=lambda d: (abs(d - target_difficulty), d)):
+            bucket = self._by_difficulty.get(level) if code is None else self._by_cell.get((level, code))
+            if bucket:
+                self._collect(bucket, asked, k - len(picked), picked)
+            if len(picked) >= k:
+                break
+        return picked
+
+    def pick(self, target_difficulty, asked, k=5, category=None):
+        candidates = self.nearest(target_difficulty, asked, k, category)
+        return random.choice(candidates) if candidates else None
+
+    @staticmethod
+    def _collect(bucket, asked, want, out):
+        size = len(bucket)
+        if want <= 0 or size == 0:
+            return
+        start = random.randrange(size)
+        for step in range(size):
+            question_id = bucket[(start + step) % size]
+            if question_id not in asked:
+                out.append(question_id)
+                want -= 1
+                if not want:
+                    return
@@ -0,0 +1,145 @@
+import numpy as np
+from gymnasium import Env, spaces
+from stable_baselines3.common.env_util import make_vec_env
+from stable_baselines3.common.vec_env import DummyVecEnv, SubprocVecEnv, VecEnv, VecMonitor
+
+# Quiz environments used to train the question-selection DQN.
+# QuizEnvironment simulates one learner; BatchedQuizVecEnv simulates N
+# learners at once with NumPy arrays and one vectorized RNG draw per step.
+
+MAX_QUESTIONS = 20
+INITIAL_KNOWLEDGE = 0.5
+
+
+def difficulty_array(dataset):
+    return dataset["Difficulty"].to_numpy(dtype=np.float32)
+
+
+# Define custom Quiz environment
+class QuizEnvironment(Env):
+    def __init__(self, dataset):
+        super().__init__()
+        self.difficulty = difficulty_array(dataset)
+        self.user_knowledge = INITIAL_KNOWLEDGE
+        self.asked_questions = set()
+
+        self.action_space = spaces.Discrete(len(self.difficulty))
+        self.observation_space = spaces.Box(low=0.0, high=1.0, shape=(1,), dtype=np.float32)
+        self.state = np.array([self.user_knowledge], dtype=np.float32)
+
+    def step(self, action):
+        action = int(action)
+        if action in self.asked_questions:
+            return self.state, -1.0, True, False, {}
+
+        self.asked_questions.add(action)
+        difficulty = float(self.difficulty[action])
+        is_correct = self.np_random.random() < self.user_knowledge
+
+        reward = difficulty if is_correct else -difficulty
+        self.user_knowledge += 0.1 * reward
+        self.user_knowledge = float(np.clip(self.user_knowledge, 0.0, 1.0))
+        self.state = np.array([self.user_knowledge], dtype=np.float32)
+        done = len(self.asked_questions) >= MAX_QUESTIONS
+
+        return self.state, reward, done, False, {}
+
+    def reset(self, seed=None, options=None):
+        super().reset(seed=seed)
+        self.user_knowledge = INITIAL_KNOWLEDGE
+        self.asked_questions.clear()
+        self.state = np.array([self.user_knowledge], dtype=np.float32)
+        return self.state, {}
+
+
+class BatchedQuizVecEnv(VecEnv):
+    # Same dynamics as QuizEnvironment for `num_envs` learners, stepped as arrays
+    def __init__(self, difficulty, num_envs, seed=None):
+        self.difficulty = np.asarray(difficulty, dtype=np.float32)
+        observation_space = spaces.Box(low=0.0, high=1.0, shape=(1,), dtype=np.float32)
+        action_space = spaces.Discrete(len(self.difficulty))
+        super().__init__(num_envs, observation_space, action_space)
+
+        self.rng = np.random.default_rng(seed)
+        self.knowledge = np.full(num_envs, INITIAL_KNOWLEDGE, dtype=np.float32)
+        self.asked = np.zeros((num_envs, len(self.difficulty)), dtype=bool)
+        self.asked_count = np.zeros(num_envs, dtype=np.int32)
+        self._rows = np.arange(num_envs)
+        self._actions = None
+
+    @classmethod
+    def from_dataset(cls, dataset, num_envs, seed=None):
+        return cls(difficulty_array(dataset), num_envs, seed=seed)
+
+    def reset(self):
+        if self._seeds[0] is not None:
+            self.rng = np.random.default_rng(self._seeds[0])
+        self._reset_seeds()
+        self.knowledge.fill(INITIAL_KNOWLEDGE)
+        self.asked.fill(False)
+        self.asked_count.fill(0)
+        return self.knowledge[:, None].copy()
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        actions = self._actions
+        repeated = self.asked[self._rows, actions]
+        fresh = ~repeated
+
+        difficulty = self.difficulty[actions]
+        correct = self.rng.random(self.num_envs) < self.knowledge
+        rewards = np.where(correct, difficulty, -difficulty)
+        rewards[repeated] = -1.0
+
+        self.asked[self._rows[fresh], actions[fresh]] = True
+        self.asked_count += fresh
+        self.knowledge = np.where(fresh, np.clip(self.knowledge + 0.1 * rewards, 0.0, 1.0), self.knowledge).astype(np.float32)
+        dones = repeated | (self.asked_count >= MAX_QUESTIONS)
+
+        obs = self.knowledge[:, None].copy()
+        infos = [{} for _ in range(self.num_envs)]
+        if dones.any():
+            for env_idx in np.flatnonzero(dones):
+                infos[env_idx]["terminal_observation"] = obs[env_idx].copy()
+                infos[env_idx]["TimeLimit.truncated"] = False
+            # Auto-reset finished learners, as the other VecEnvs do
+            self.knowledge[dones] = INITIAL_KNOWLEDGE
+            self.asked[dones] = False
+            self.asked_count[dones] = 0
+            obs = self.knowledge[:, None].copy()
+
+        return obs, rewards.astype(np.float32), dones, infos
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(self, attr_name) for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        # All learners share this one env, so the method runs once and every
+        # requested index gets its result
+        result = getattr(self, method_name)(*method_args, **method_kwargs)
+        return [result for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
+
+
+def make_quiz_vec_env(dataset, n_envs=1, mode="batched", seed=None):
+    # mode: "batched" (NumPy, one process), "subproc" (one process per env)
+    # or "dummy" (QuizEnvironment instances stepped in a Python loop)
+    if mode == "batched":
+        env = BatchedQuizVecEnv.from_dataset(dataset, n_envs, seed=seed)
+        if seed is not None:
+            env.seed(seed)
+        return VecMonitor(env)
+    if mode in ("subproc", "dummy"):
+        vec_env_cls = SubprocVecEnv if mode == "subproc" else DummyVecEnv
+        return make_vec_env(lambda: QuizEnvironment(dataset), n_envs=n_envs, seed=seed, vec_env_cls=vec_env_cls)
+    raise ValueError(f"Unknown vectorization mode: {mode}")
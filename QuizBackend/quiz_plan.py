@@ -0,0 +1,145 @@
+import random
+import threading
+
+from instrumentation import span
+from question_bank import AskedBitmap
+
+# Whole-quiz plans for /api/quiz_plan. Knowledge moves in steps of 0.1 between
+# 0 and 1 (see submit_answer), so a quiz can only ever be in one of eleven
+# states. A plan holds the id to ask first and, for each state, a ranked list
+# of `length` candidate ids; the client walks it on its own:
+#   knowledge = plan["start_knowledge"]
+#   ask plan["first"] on the first step; after that
+#     candidates = plan["levels"][round(knowledge * 10)] and
+#     ask the first candidate not asked yet;
+#   knowledge += 0.1 if correct else -0.1 (clamped to 0..1) after each answer
+# and posts every answer at the end through /api/submit_quiz_re. `length`
+# candidates per state are always enough, since at most length - 1 of them can
+# have been asked already. Question texts, options and answers are sent once
+# in plan["questions"], keyed by id.
+#
+# The heuristic plan ranks each state's nearest-difficulty bucket in random
+# order, i.e. next_question's choice when it walks the same state. The DQN's
+# choice depends only on the knowledge level and what was asked, so its plan
+# (Q-values ranked per state) is exactly what next_question would serve; the
+# rankings are computed once per model and bank version.
+
+KNOWLEDGE_STEP = 0.1
+KNOWLEDGE_STATES = 11
+START_KNOWLEDGE = 0.5
+
+
+def state_index(knowledge_level):
+    return min(KNOWLEDGE_STATES - 1, max(0, round(knowledge_level / KNOWLEDGE_STEP)))
+
+
+def heuristic_rankings(bank, length):
+    # first: one id uniform over the bank, like sample_any; levels: nearest
+    # difficulty first, shuffled within a level like pick()'s random choice
+    first = bank.sample_any(AskedBitmap())
+
+    levels = []
+    for index in range(KNOWLEDGE_STATES):
+        target = index * KNOWLEDGE_STEP * 3
+        candidates = bank.nearest(target, AskedBitmap(), k=length)
+        random.shuffle(candidates)
+        candidates.sort(key=lambda question_id: (abs(bank.difficulty[question_id] - target), bank.difficulty[question_id]))
+        levels.append(candidates)
+    return first, levels
+
+
+class PolicyRankings:
+    # Ids by descending Q-value for every knowledge state, for the newest
+    # (model version, bank version) seen; older versions are dropped
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key = None
+        self._order = None
+
+    def get(self, snapshot):
+        key = (snapshot.model_version, snapshot.bank_version)
+        with self._lock:
+            if self._key == key:
+                return self._order
+        order = self._rank(snapshot.model, len(snapshot.bank))
+        with self._lock:
+            self._key, self._order = key, order
+        return order
+
+    @staticmethod
+    def _rank(model, bank_size):
+        # The model already loaded numpy and torch; importing them here keeps them off the startup path
+        import numpy as np
+        import torch
+
+        obs = np.array([[index * KNOWLEDGE_STEP] for index in range(KNOWLEDGE_STATES)], dtype=np.float32)
+        with span("inference"), torch.no_grad():
+            q_values = model.q_net(torch.as_tensor(obs, device=model.device)).cpu().numpy()
+        # Ids beyond the bank (the model was trained on a larger one) are never served
+        q_values = q_values[:, :bank_size]
+        return np.argsort(-q_values, axis=1, kind="stable")
+
+    def rankings(self, snapshot, length):
+        order = self.get(snapshot)
+        levels = [[int(question_id) for question_id in row[:length]] for row in order]
+        start = levels[state_index(START_KNOWLEDGE)]
+        return (start[0] if start else None), levels
+
+
+def build_plan(snapshot, length, policy_rankings=None):
+    # policy_rankings: a PolicyRankings when the DQN policy serves, else None
+    # for the heuristic plan
+    bank = snapshot.bank
+    length = min(length, len(bank))
+    if policy_rankings is not None and snapshot.model is not None:
+        policy = "dqn"
+        first, levels = policy_rankings.rankings(snapshot, length)
+    else:
+        policy = "heuristic"
+        with span("bank"):
+            first, levels = heuristic_rankings(bank, length)
+
+    questions = {}
+    with span("bank"):
+        for question_id in [first, *(question_id for level in levels for question_id in level)]:
+            if question_id is None or question_id in questions:
+                continue
+            row = bank.row(question_id)
+            questions[question_id] = {
+                "question": row["Question"],
+                "options": snapshot.distractors.options(row["Correct Answer"], k=3, category=row["Category"]),
+                "correct_answer": row["Correct Answer"],
+                "difficulty": row["Difficulty"],
+                "weakarea": row["Category"],
+            }
+
+    return {
+        "policy": policy,
+        "length": length,
+        "start_knowledge": START_KNOWLEDGE,
+        "knowledge_step": KNOWLEDGE_STEP,
+        "first": first,
+        "levels": levels,
+        "questions": questions,
+    }
+
+
+def walk_plan(plan, answer_correctly):
+    # Reference walk of a plan, as a client does it: answer_correctly(step,
+    # question_id) -> bool. Returns the ids asked, in order.
+    knowledge = plan["start_knowledge"]
+    asked = []
+    for step in range(plan["length"]):
+        if step == 0:
+            question_id = plan["first"]
+        else:
+            candidates = plan["levels"][state_index(knowledge)]
+            question_id = next((candidate for candidate in candidates if candidate not in asked), None)
+        if question_id is None:
+            break
+        asked.append(question_id)
+        if answer_correctly(step, question_id):
+            knowledge = min(1.0, knowledge + KNOWLEDGE_STEP)
+        else:
+            knowledge = max(0.0, knowledge - KNOWLEDGE_STEP)
+    return asked
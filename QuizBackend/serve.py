@@ -0,0 +1,124 @@
+import argparse
+import multiprocessing
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# Production launcher for the quiz API (`python Quiz.py` stays the debug server).
+# From the repository root:
+#   python QuizBackend/serve.py --mode gevent --workers 4 --connections 1000
+#
+# Modes (all run under gunicorn, one Quiz.py import per worker process):
+#   threads  gthread workers, `--threads` requests in flight per process.
+#            Simple and predictable; concurrency is workers x threads.
+#   gevent   gevent workers with the standard library monkey-patched, so a
+#            request waiting on MySQL, the pool or the write-behind queue
+#            yields instead of holding an OS thread. Each worker takes up to
+#            `--connections` concurrent clients; this is the mode for
+#            thousands of open quiz sessions per node. Set DB_MYSQL_PURE=1
+#            (the default here) so mysql.connector does its I/O in Python,
+#            where gevent can switch; SQLite calls still block briefly.
+#
+# Recommended configuration per node:
+#   --mode gevent --workers <cores> --connections 1000
+#   DB_BACKEND=mysql, DB_POOL_SIZE=20 (per worker; size MySQL max_connections
+#     for workers x DB_POOL_SIZE), DB_POOL_TIMEOUT=5
+#   SESSION_BACKEND=sqlite (set automatically when workers > 1 and it is unset
+#     or lru: the LRU store is per process and sessions must survive a request
+#     landing elsewhere)
+#   LEADERBOARD_REFRESH=5, QUESTION_POLICY as needed
+#   WRITE_BEHIND unset: each worker buffers its own writes and
+#     flush_pending_writes() only drains the worker it runs in, so a history
+#     or weak-areas request landing on another worker could miss answers just
+#     submitted. Write-behind keeps read-your-writes with a single worker only.
+#   the exported question_bank.qbank, which all workers map and share
+#
+# Benchmark a running server with
+#   python QuizBackend/benchmark.py --url http://127.0.0.1:5001 --users 200
+# Worker processes are not preloaded: Quiz.py starts background threads
+# (registry watcher, write-behind, policy server) that must not cross a fork.
+
+DEFAULT_BIND = "0.0.0.0:5001"
+DEFAULT_THREADS = 8
+DEFAULT_CONNECTIONS = 1000
+DEFAULT_POOL_SIZE = 20
+
+
+def default_workers():
+    return multiprocessing.cpu_count()
+
+
+def configure_environment(args):
+    # Settings Quiz.py reads at import, applied before any worker starts.
+    # Explicit environment (or .env) values win.
+    if args.workers > 1 and os.getenv("SESSION_BACKEND", "lru") == "lru":
+        # The LRU store is the one backend that cannot work here; any other
+        # explicit choice is left alone
+        print("serve: SESSION_BACKEND=sqlite, the LRU session store is per process")
+        os.environ["SESSION_BACKEND"] = "sqlite"
+    if args.workers > 1 and os.getenv("WRITE_BEHIND") == "1":
+        # Left as set, but reads on one worker do not see another's buffer
+        print("serve: WRITE_BEHIND=1 with several workers; reads may miss answers buffered by another worker")
+    if args.mode == "gevent":
+        os.environ.setdefault("DB_MYSQL_PURE", "1")
+        os.environ.setdefault("DB_POOL_SIZE", str(DEFAULT_POOL_SIZE))
+    else:
+        os.environ.setdefault("DB_POOL_SIZE", str(args.threads))
+
+
+def gunicorn_options(args):
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "timeout": args.timeout,
+        "keepalive": 5,
+        "graceful_timeout": 30,
+        "accesslog": "-" if args.access_log else None,
+        "errorlog": "-",
+        "preload_app": False,
+    }
+    if args.mode == "gevent":
+        options.update(worker_class="gevent", worker_connections=args.connections)
+    else:
+        options.update(worker_class="gthread", threads=args.threads)
+    return options
+
+
+def run(args):
+    from gunicorn.app.base import BaseApplication
+
+    class QuizApplication(BaseApplication):
+        def load_config(self):
+            for key, value in gunicorn_options(args).items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+            from Quiz import app
+
+            return app
+
+    QuizApplication().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the quiz API under gunicorn.")
+    parser.add_argument("--mode", choices=("threads", "gevent"), default="threads")
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS, help="threads per worker (threads mode)")
+    parser.add_argument("--connections", type=int, default=DEFAULT_CONNECTIONS,
+                        help="concurrent clients per worker (gevent mode)")
+    parser.add_argument("--bind", default=os.getenv("QUIZ_BIND", DEFAULT_BIND))
+    parser.add_argument("--timeout", type=int, default=30, help="seconds before a stuck worker is restarted")
+    parser.add_argument("--access-log", action="store_true")
+    args = parser.parse_args()
+
+    load_dotenv()
+    configure_environment(args)
+    run(args)
+
+
+if __name__ == "__main__":
+    main()
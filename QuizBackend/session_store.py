@@ -0,0 +1,306 @@
+import json
+import os
+import secrets
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from instrumentation import span
+
+# Server-side sessions for the quiz API. The cookie only carries a signed
+# session id; the quiz state lives in a bounded store:
+#   SESSION_BACKEND=lru    (default) in-process LRU with TTL, single worker
+#   SESSION_BACKEND=sqlite local key-value file shared by all workers on a host
+
+DEFAULT_SESSION_TTL = 6 * 60 * 60
+DEFAULT_MAX_SESSIONS = 10000
+# Expired sqlite rows are purged every this many writes
+SQLITE_PURGE_EVERY = 500
+
+
+# 📦 Compact binary encoding of the quiz state.
+# Layout: version, presence flags, then the fields whose flag is set, then
+# any remaining keys (username, ...) as compact JSON.
+CODEC_VERSION = 1
+F_USER_ID = 1 << 0
+F_QUIZ_ID = 1 << 1
+F_ATTEMPT_ID = 1 << 2
+F_KNOWLEDGE = 1 << 3
+F_SCORE = 1 << 4
+F_SCORE_INT = 1 << 5
+F_ASKED = 1 << 6
+F_WEAK_AREAS = 1 << 7
+
+_HEADER = struct.Struct("<BB")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_COUNT = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def encode_session(data):
+    rest = dict(data)
+    flags = 0
+    parts = []
+
+    for key, flag in (("user_id", F_USER_ID), ("quiz_id", F_QUIZ_ID), ("attempt_id", F_ATTEMPT_ID)):
+        if _is_int(rest.get(key)):
+            flags |= flag
+            parts.append(_INT.pack(rest.pop(key)))
+
+    if isinstance(rest.get("knowledge_level"), float):
+        flags |= F_KNOWLEDGE
+        parts.append(_FLOAT.pack(rest.pop("knowledge_level")))
+
+    score = rest.get("score")
+    if isinstance(score, float) or _is_int(score):
+        flags |= F_SCORE | (F_SCORE_INT if _is_int(score) else 0)
+        parts.append(_FLOAT.pack(rest.pop("score")))
+
+    asked = rest.get("questions_asked")
+    if isinstance(asked, list) and len(asked) <= 0xFFFF and all(_is_int(q) and 0 <= q <= 0xFFFFFFFF for q in asked):
+        flags |= F_ASKED
+        parts.append(_COUNT.pack(len(asked)))
+        parts.append(struct.pack(f"<{len(asked)}I", *asked))
+        rest.pop("questions_asked")
+
+    weak_areas = rest.get("weak_areas")
+    if (isinstance(weak_areas, dict) and len(weak_areas) <= 0xFFFF
+            and all(isinstance(k, str) and _is_int(v) and 0 <= v <= 0xFFFFFFFF for k, v in weak_areas.items())):
+        flags |= F_WEAK_AREAS
+        parts.append(_COUNT.pack(len(weak_areas)))
+        for name, count in weak_areas.items():
+            encoded = name.encode("utf-8")
+            parts.append(_COUNT.pack(len(encoded)) + encoded + _U32.pack(count))
+        rest.pop("weak_areas")
+
+    tail = json.dumps(rest, separators=(",", ":")).encode("utf-8") if rest else b""
+    return _HEADER.pack(CODEC_VERSION, flags) + b"".join(parts) + tail
+
+
+def decode_session(blob):
+    version, flags = _HEADER.unpack_from(blob, 0)
+    if version != CODEC_VERSION:
+        raise ValueError(f"Unknown session encoding version {version}")
+    offset = _HEADER.size
+    data = {}
+
+    for key, flag in (("user_id", F_USER_ID), ("quiz_id", F_QUIZ_ID), ("attempt_id", F_ATTEMPT_ID)):
+        if flags & flag:
+            data[key] = _INT.unpack_from(blob, offset)[0]
+            offset += _INT.size
+
+    if flags & F_KNOWLEDGE:
+        data["knowledge_level"] = _FLOAT.unpack_from(blob, offset)[0]
+        offset += _FLOAT.size
+
+    if flags & F_SCORE:
+        score = _FLOAT.unpack_from(blob, offset)[0]
+        data["score"] = int(score) if flags & F_SCORE_INT else score
+        offset += _FLOAT.size
+
+    if flags & F_ASKED:
+        count = _COUNT.unpack_from(blob, offset)[0]
+        offset += _COUNT.size
+        data["questions_asked"] = list(struct.unpack_from(f"<{count}I", blob, offset))
+        offset += 4 * count
+
+    if flags & F_WEAK_AREAS:
+        count = _COUNT.unpack_from(blob, offset)[0]
+        offset += _COUNT.size
+        weak_areas = {}
+        for _ in range(count):
+            size = _COUNT.unpack_from(blob, offset)[0]
+            offset += _COUNT.size
+            name = blob[offset:offset + size].decode("utf-8")
+            offset += size
+            weak_areas[name] = _U32.unpack_from(blob, offset)[0]
+            offset += _U32.size
+        data["weak_areas"] = weak_areas
+
+    if offset < len(blob):
+        data.update(json.loads(blob[offset:].decode("utf-8")))
+    return data
+
+
+# 🗄️ Stores: get/set/delete raw session blobs by id
+class LRUSessionStore:
+    def __init__(self, max_entries=DEFAULT_MAX_SESSIONS, ttl=DEFAULT_SESSION_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            blob, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return blob
+
+    def set(self, sid, blob):
+        with self._lock:
+            self._entries[sid] = (blob, time.monotonic() + self.ttl)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteSessionStore:
+    def __init__(self, path, max_entries=DEFAULT_MAX_SESSIONS, ttl=DEFAULT_SESSION_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                sid TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires_at)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, sid):
+        row = self._conn().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, sid, blob):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)",
+            (sid, blob, time.time() + self.ttl)
+        )
+        conn.commit()
+        self._writes += 1
+        if self._writes % SQLITE_PURGE_EVERY == 0:
+            self.purge()
+
+    def delete(self, sid):
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+        conn.commit()
+
+    def purge(self):
+        # Drop expired sessions, then the least recently written past the cap
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+        conn.execute("""
+            DELETE FROM sessions WHERE sid IN (
+                SELECT sid FROM sessions ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+        conn.commit()
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class QuizSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class StoreSessionInterface(SessionInterface):
+    # Routes that mutate nested values (questions_asked, weak_areas) must set
+    # session.modified = True, as with any Flask session.
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="quiz-session")
+
+    def open_session(self, app, request):
+        with span("session"):
+            cookie = request.cookies.get(self.get_cookie_name(app))
+            if cookie:
+                try:
+                    sid = self._signer(app).unsign(cookie).decode("ascii")
+                except BadSignature:
+                    sid = None
+                if sid:
+                    blob = self.store.get(sid)
+                    if blob is not None:
+                        try:
+                            return QuizSession(decode_session(blob), sid=sid)
+                        except (ValueError, struct.error):
+                            pass
+            return QuizSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        with span("session"):
+            name = self.get_cookie_name(app)
+            domain = self.get_cookie_domain(app)
+            path = self.get_cookie_path(app)
+
+            if not session:
+                if session.modified:
+                    self.store.delete(session.sid)
+                    response.delete_cookie(name, domain=domain, path=path)
+                return
+
+            if not self.should_set_cookie(app, session):
+                return
+
+            self.store.set(session.sid, encode_session(dict(session)))
+            response.set_cookie(
+                name,
+                self._signer(app).sign(session.sid.encode("ascii")).decode("ascii"),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app),
+                domain=domain,
+                path=path,
+                secure=self.get_cookie_secure(app),
+                samesite=self.get_cookie_samesite(app),
+            )
+
+
+def session_interface_from_env():
+    ttl = int(os.getenv("SESSION_TTL", DEFAULT_SESSION_TTL))
+    max_entries = int(os.getenv("SESSION_MAX_ENTRIES", DEFAULT_MAX_SESSIONS))
+    if os.getenv("SESSION_BACKEND", "lru") == "sqlite":
+        path = os.getenv("SESSION_SQLITE_PATH", "QuizBackend/data/sessions.sqlite3")
+        return StoreSessionInterface(SQLiteSessionStore(path, max_entries=max_entries, ttl=ttl))
+    return StoreSessionInterface(LRUSessionStore(max_entries=max_entries, ttl=ttl))
@@ -0,0 +1,32 @@
+import time
+
+# Startup phase timings for an API worker. Quiz.py creates the report before
+# its other imports, marks each phase as it finishes, prints the summary once
+# the worker is ready and serves it from /api/admin/startup.
+
+
+class StartupReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = []
+        self.ready_seconds = None
+
+    def mark(self, phase):
+        # Time since the previous mark is charged to `phase`
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def ready(self):
+        self.ready_seconds = time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            "phases": [{"phase": phase, "seconds": round(seconds, 4)} for phase, seconds in self.phases],
+            "ready_seconds": None if self.ready_seconds is None else round(self.ready_seconds, 4),
+        }
+
+    def summary(self):
+        phases = ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.phases)
+        return f"Startup: {phases}; ready in {self.ready_seconds * 1000:.0f}ms"
@@ -0,0 +1,543 @@
+import json
+import os
+
+from db_pool import ConnectionPool, SQLiteConnection, mysql_factory, DEFAULT_POOL_SIZE, DEFAULT_POOL_TIMEOUT, DEFAULT_PING_AFTER
+from leaderboard import Leaderboard
+from migrations import migrate
+from video_catalog import VideoCatalog
+
+# Repository layer for all quiz persistence. Routes call QuizRepository
+# methods; the SQL lives here and runs against a pluggable backend:
+#   DB_BACKEND=mysql  (default) the MySQL server configured in .env
+#   DB_BACKEND=sqlite an embedded SQLite file in WAL mode
+# Either way the schema is brought up to date on start (migrations.py).
+
+
+def _pool_options():
+    return {
+        "size": int(os.getenv("DB_POOL_SIZE", DEFAULT_POOL_SIZE)),
+        "timeout": float(os.getenv("DB_POOL_TIMEOUT", DEFAULT_POOL_TIMEOUT)),
+        "ping_after": float(os.getenv("DB_POOL_PING_AFTER", DEFAULT_PING_AFTER)),
+    }
+
+
+class MySQLBackend:
+    name = "mysql"
+    explain_prefix = "EXPLAIN "
+    video_track_upsert = """
+        INSERT INTO VideoTrack (user_id, video_id, quiz_id, watched) VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE watched = VALUES(watched), clicked_at = NOW()
+    """
+    # Inserts nothing (rowcount 0, no insert id) when the name is taken. Not
+    # INSERT IGNORE, which would also turn errors such as an over-long name
+    # into warnings and truncated rows.
+    user_insert = """
+        INSERT INTO users (user_name, password) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE user_id = user_id
+    """
+    # Creates the user's LeaderboardBest row if missing (see _update_best)
+    best_row_insert = """
+        INSERT INTO LeaderboardBest (user_id, user_name) SELECT user_id, user_name FROM users WHERE user_id = %s
+        ON DUPLICATE KEY UPDATE LeaderboardBest.user_id = LeaderboardBest.user_id
+    """
+    # Locking reads: InnoDB's plain SELECT reads the transaction's snapshot
+    # without waiting for concurrent writers
+    for_update = " FOR UPDATE"
+
+    def __init__(self, **pool_options):
+        self.pool = ConnectionPool(mysql_factory(), **pool_options)
+
+    def bootstrap(self):
+        with self.pool.connection() as conn:
+            migrate(conn, self.name)
+
+
+class SQLiteBackend:
+    name = "sqlite"
+    explain_prefix = "EXPLAIN QUERY PLAN "
+    video_track_upsert = """
+        INSERT INTO VideoTrack (user_id, video_id, quiz_id, watched) VALUES (%s, %s, %s, %s)
+        ON CONFLICT (user_id, quiz_id, video_id) DO UPDATE SET watched = excluded.watched, clicked_at = NOW()
+    """
+    user_insert = "INSERT INTO users (user_name, password) VALUES (%s, %s) ON CONFLICT (user_name) DO NOTHING"
+    best_row_insert = """
+        INSERT INTO LeaderboardBest (user_id, user_name) SELECT user_id, user_name FROM users WHERE user_id = %s
+        ON CONFLICT (user_id) DO NOTHING
+    """
+    # Every caller has written before _update_best, so its transaction holds
+    # the database's single write lock and plain reads are already current
+    for_update = ""
+
+    def __init__(self, path, **pool_options):
+        self.path = path
+        self.pool = ConnectionPool(self._connect, **pool_options)
+
+    def _connect(self):
+        conn = SQLiteConnection(self.path)
+        # WAL lets readers run alongside the single writer
+        conn.raw.execute("PRAGMA journal_mode=WAL")
+        conn.raw.execute("PRAGMA synchronous=NORMAL")
+        conn.raw.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def bootstrap(self):
+        with self.pool.connection() as conn:
+            migrate(conn, self.name)
+
+
+def backend_from_env():
+    if os.getenv("DB_BACKEND", "mysql") == "sqlite":
+        return SQLiteBackend(os.getenv("DB_SQLITE_PATH", "QuizBackend/data/quiz.sqlite3"), **_pool_options())
+    return MySQLBackend(**_pool_options())
+
+
+class QuizRepository:
+    def __init__(self, backend, leaderboard_refresh=5.0, video_refresh=300.0):
+        self.backend = backend
+        self.pool = backend.pool
+        self.leaderboard_index = Leaderboard(refresh_interval=leaderboard_refresh)
+        self.video_catalog = VideoCatalog(refresh_interval=video_refresh)
+        backend.bootstrap()
+        self._backfill_leaderboard()
+        self.reload_videos()
+
+    def connection(self):
+        return self.pool.connection()
+
+    def explain(self, sql, params=()):
+        # Query plan for comparing backends
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(self.backend.explain_prefix + sql, params)
+            return cursor.fetchall()
+
+    # 👤 Users
+    def get_user_by_name(self, username):
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM users WHERE user_name = %s", (username,))
+            return cursor.fetchone()
+
+    def create_user(self, username, password_hash):
+        # Returns the new user_id, or None when the username is taken. The
+        # database assigns the id and the unique user_name key settles
+        # concurrent registrations of the same name.
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(self.backend.user_insert, (username, password_hash))
+            if cursor.rowcount != 1 or not cursor.lastrowid:
+                return None
+            user_id = cursor.lastrowid
+
+            # Listed on the leaderboard without an attempt until the first quiz
+            cursor.execute("INSERT INTO LeaderboardBest (user_id, user_name) VALUES (%s, %s)", (user_id, username))
+            conn.commit()
+
+        self.leaderboard_index.update(self._empty_best(user_id, username))
+        return user_id
+
+    # 🔢 Attempt ids
+    def _allocate_attempt_id(self, cursor, user_id):
+        # Bumps the user's attempt counter inside the caller's transaction.
+        # The UPDATE takes the user's row lock (the write lock on SQLite), so
+        # concurrent attempts of one user get consecutive, distinct ids.
+        cursor.execute("UPDATE users SET last_attempt_id = last_attempt_id + 1 WHERE user_id = %s", (user_id,))
+        cursor.execute("SELECT last_attempt_id FROM users WHERE user_id = %s", (user_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise LookupError(f"User {user_id} does not exist")
+        return row[0]
+
+    # 📝 Quizzes
+    def start_quiz(self, user_id, knowledge_level, score):
+        # Returns (quiz_id, attempt_id)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            attempt_id = self._allocate_attempt_id(cursor, user_id)
+
+            # Clean video track data for this user
+            cursor.execute("DELETE FROM VideoTrack WHERE user_id = %s", (user_id,))
+
+            cursor.execute(
+                "INSERT INTO Quiz (user_id, knowledge_level, score, weakareas, attempt_id) VALUES (%s, %s, %s, %s, %s)",
+                (user_id, knowledge_level, score, json.dumps({}), attempt_id)
+            )
+            quiz_id = cursor.lastrowid
+            best = self._update_best(cursor, user_id, quiz_id, score)
+            conn.commit()
+
+        self._publish_best(best)
+        return quiz_id, attempt_id
+
+    def record_answer(self, user_id, quiz_id, attempt_id, description, is_correct, correct_answer, weakarea, score, knowledge_level):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO Question (quiz_id, attempt_id, description, is_correct, correct_answer, weakarea) VALUES (%s, %s, %s, %s, %s, %s)",
+                (quiz_id, attempt_id, description, is_correct, correct_answer, weakarea)
+            )
+            cursor.execute("UPDATE Quiz SET score = %s, knowledge_level = %s WHERE quiz_id = %s",
+                           (score, knowledge_level, quiz_id))
+            best = self._update_best(cursor, user_id, quiz_id, score)
+            conn.commit()
+
+        self._publish_best(best)
+
+    def save_quiz_results(self, user_id, quiz_id, knowledge_level, score, weakareas):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE Quiz SET knowledge_level = %s, score = %s, weakareas = %s WHERE quiz_id = %s",
+                           (knowledge_level, score, json.dumps(weakareas), quiz_id))
+            best = self._update_best(cursor, user_id, quiz_id, score)
+            conn.commit()
+
+        self._publish_best(best)
+
+    def apply_quiz_writes(self, writes):
+        # Applies buffered submit_answer / save_quiz_results writes in one
+        # transaction. Each write is a dict with kind "answer" or "results";
+        # only the last score per quiz needs to reach the Quiz row.
+        answer_rows = []
+        final = {}
+        for write in writes:
+            state = final.setdefault(write["quiz_id"], {"user_id": write["user_id"], "weakareas": None})
+            state["score"] = write["score"]
+            state["knowledge_level"] = write["knowledge_level"]
+            if write["kind"] == "answer":
+                answer_rows.append((write["quiz_id"], write["attempt_id"], write["description"], write["is_correct"],
+                                    write["correct_answer"], write["weakarea"]))
+            else:
+                state["weakareas"] = json.dumps(write["weakareas"])
+
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            if answer_rows:
+                cursor.executemany(
+                    "INSERT INTO Question (quiz_id, attempt_id, description, is_correct, correct_answer, weakarea) VALUES (%s, %s, %s, %s, %s, %s)",
+                    answer_rows
+                )
+
+            progress = [(state["score"], state["knowledge_level"], quiz_id)
+                        for quiz_id, state in final.items() if state["weakareas"] is None]
+            results = [(state["knowledge_level"], state["score"], state["weakareas"], quiz_id)
+                       for quiz_id, state in final.items() if state["weakareas"] is not None]
+            if progress:
+                cursor.executemany("UPDATE Quiz SET score = %s, knowledge_level = %s WHERE quiz_id = %s", progress)
+            if results:
+                cursor.executemany("UPDATE Quiz SET knowledge_level = %s, score = %s, weakareas = %s WHERE quiz_id = %s", results)
+
+            bests = [self._update_best(cursor, state["user_id"], quiz_id, state["score"]) for quiz_id, state in final.items()]
+            conn.commit()
+
+        for best in bests:
+            self._publish_best(best)
+
+    def record_retake(self, user_id, answers, score, knowledge_level, weakareas):
+        # answers: (description, correct_answer, is_correct, weakarea) tuples.
+        # Everything is written in one transaction; returns the new attempt_id.
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            attempt_id = self._allocate_attempt_id(cursor, user_id)
+
+            # Delete previous video tracking for this user (to reset history for this new quiz)
+            cursor.execute("DELETE FROM VideoTrack WHERE user_id = %s", (user_id,))
+
+            cursor.execute("""
+                INSERT INTO Quiz (user_id, knowledge_level, score, weakareas, attempt_id)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (user_id, knowledge_level, score, json.dumps(weakareas), attempt_id))
+            quiz_id = cursor.lastrowid
+
+            # Store answered questions into Question table (for logging only),
+            # as one batched insert whatever the number of answers
+            if answers:
+                cursor.executemany("""
+                    INSERT INTO Question (quiz_id, attempt_id, description, correct_answer, is_correct, weakarea)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, [(quiz_id, attempt_id, description, correct_answer, is_correct, weakarea)
+                      for description, correct_answer, is_correct, weakarea in answers])
+
+            best = self._update_best(cursor, user_id, quiz_id, score)
+            conn.commit()
+
+        self._publish_best(best)
+        return attempt_id
+
+    def leaderboard(self, offset=0, limit=None):
+        # Returns (total, rows) from the in-memory index, best score first
+        if self.leaderboard_index.needs_reload():
+            self.reload_leaderboard()
+        return len(self.leaderboard_index), self.leaderboard_index.page(offset, limit)
+
+    def reload_leaderboard(self):
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT * FROM LeaderboardBest")
+            rows = cursor.fetchall()
+        self.leaderboard_index.load(rows)
+
+    def rebuild_leaderboard(self):
+        # Recompute the summary table from Quiz (backfill / repair)
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM LeaderboardBest")
+            cursor.execute("""
+                INSERT INTO LeaderboardBest (user_id, user_name, quiz_id, attempt_id, score, knowledge_level, weakareas)
+                SELECT u.user_id, u.user_name, q.quiz_id, q.attempt_id, q.score, q.knowledge_level, q.weakareas
+                FROM users u
+                LEFT JOIN Quiz q ON q.quiz_id = (
+                    SELECT q2.quiz_id FROM Quiz q2
+                    WHERE q2.user_id = u.user_id
+                    ORDER BY q2.score DESC, q2.quiz_id
+                    LIMIT 1
+                )
+            """)
+            conn.commit()
+        self.reload_leaderboard()
+
+    def _backfill_leaderboard(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM LeaderboardBest")
+            summarized = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM users")
+            users = cursor.fetchone()[0]
+        if summarized != users:
+            self.rebuild_leaderboard()
+
+    def _update_best(self, cursor, user_id, quiz_id, score):
+        # Incrementally keep LeaderboardBest at the user's best attempt.
+        # Returns the new summary row, or None when it did not change.
+        # The row is created first and then read locked, so concurrent
+        # finishes of one user's quizzes take turns here and each compares
+        # against the best the previous one left, instead of a stale read
+        # letting a lower score overwrite a higher one.
+        if user_id is None:
+            return None
+        cursor.execute(self.backend.best_row_insert, (user_id,))
+        cursor.execute("SELECT quiz_id, score FROM LeaderboardBest WHERE user_id = %s" + self.backend.for_update, (user_id,))
+        current = cursor.fetchone()
+        if current is None:
+            # No such user
+            return None
+
+        best_quiz_id, best_score = current
+        if best_score is not None and best_quiz_id != quiz_id and score <= best_score:
+            return None
+
+        if best_quiz_id == quiz_id and best_score is not None and score < best_score:
+            # The best attempt lost points, another attempt may now be ahead
+            cursor.execute("""
+                SELECT quiz_id, attempt_id, score, knowledge_level, weakareas FROM Quiz
+                WHERE user_id = %s ORDER BY score DESC, quiz_id LIMIT 1
+            """ + self.backend.for_update, (user_id,))
+        else:
+            cursor.execute(
+                "SELECT quiz_id, attempt_id, score, knowledge_level, weakareas FROM Quiz WHERE quiz_id = %s",
+                (quiz_id,)
+            )
+        quiz = cursor.fetchone()
+
+        cursor.execute("""
+            UPDATE LeaderboardBest
+            SET quiz_id = %s, attempt_id = %s, score = %s, knowledge_level = %s, weakareas = %s
+            WHERE user_id = %s
+        """, (*quiz, user_id))
+        cursor.execute("SELECT user_name FROM LeaderboardBest WHERE user_id = %s", (user_id,))
+        user_name = cursor.fetchone()[0]
+
+        return {
+            "user_id": user_id,
+            "user_name": user_name,
+            "quiz_id": quiz[0],
+            "attempt_id": quiz[1],
+            "score": quiz[2],
+            "knowledge_level": quiz[3],
+            "weakareas": quiz[4],
+        }
+
+    def _publish_best(self, best):
+        # Called after commit so the index never shows uncommitted scores
+        if best is not None:
+            self.leaderboard_index.update(best)
+
+    @staticmethod
+    def _empty_best(user_id, user_name):
+        return {
+            "user_id": user_id,
+            "user_name": user_name,
+            "quiz_id": None,
+            "attempt_id": None,
+            "score": None,
+            "knowledge_level": None,
+            "weakareas": None,
+        }
+
+    def quiz_history(self, user_id, before=None, limit=None):
+        # [(quiz, questions)] newest first, optionally only quizzes with
+        # quiz_id < before. Two queries regardless of how many quizzes match.
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            sql = "SELECT * FROM Quiz WHERE user_id = %s"
+            params = [user_id]
+            if before is not None:
+                sql += " AND quiz_id < %s"
+                params.append(before)
+            sql += " ORDER BY quiz_id DESC"
+            if limit is not None:
+                sql += " LIMIT %s"
+                params.append(limit)
+            cursor.execute(sql, params)
+            quizzes = cursor.fetchall()
+            if not quizzes:
+                return []
+
+            questions_by_quiz = {quiz["quiz_id"]: [] for quiz in quizzes}
+            placeholders = ', '.join(['%s'] * len(questions_by_quiz))
+            cursor.execute(f"SELECT * FROM Question WHERE quiz_id IN ({placeholders})", list(questions_by_quiz))
+            for question in cursor.fetchall():
+                questions_by_quiz[question["quiz_id"]].append(question)
+
+            return [(quiz, questions_by_quiz[quiz["quiz_id"]]) for quiz in quizzes]
+
+    def stream_answers(self, page_size=5000):
+        # Every logged answer as (quiz_id, description, is_correct), in
+        # question_id pages so neither side holds the whole table; the
+        # connection goes back to the pool between pages
+        last_id = 0
+        while True:
+            with self.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT question_id, quiz_id, description, is_correct FROM Question WHERE question_id > %s ORDER BY question_id LIMIT %s",
+                    (last_id, page_size)
+                )
+                rows = cursor.fetchall()
+            if not rows:
+                return
+            for _, quiz_id, description, is_correct in rows:
+                yield quiz_id, description, is_correct
+            last_id = rows[-1][0]
+
+    def latest_quiz(self, user_id):
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT * FROM Quiz
+                WHERE user_id = %s
+                ORDER BY attempt_id DESC
+                LIMIT 1
+            """, (user_id,))
+            return cursor.fetchone()
+
+    def incorrect_questions_latest_attempt(self, user_id, limit=10):
+        # Returns (latest_attempt, questions); latest_attempt is None without attempts
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT MAX(attempt_id) AS latest FROM Quiz WHERE user_id = %s", (user_id,))
+            latest_attempt = cursor.fetchone()["latest"]
+            if not latest_attempt:
+                return None, []
+
+            cursor.execute("""
+                SELECT description, correct_answer, weakarea, COUNT(*) AS attempt_count
+                FROM Question
+                WHERE is_correct = 0 AND quiz_id IN (
+                    SELECT quiz_id FROM Quiz WHERE user_id = %s AND attempt_id = %s
+                )
+                GROUP BY description, correct_answer, weakarea
+                ORDER BY attempt_count DESC
+                LIMIT %s;
+            """, (user_id, latest_attempt, limit))
+            return latest_attempt, cursor.fetchall()
+
+    def delete_user_data(self, user_id):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM VideoTrack WHERE user_id = %s", (user_id,))
+            cursor.execute("DELETE FROM Question WHERE quiz_id IN (SELECT quiz_id FROM Quiz WHERE user_id = %s)", (user_id,))
+            cursor.execute("DELETE FROM Quiz WHERE user_id = %s", (user_id,))
+            # Attempt numbering starts over with the user's history
+            cursor.execute("UPDATE users SET last_attempt_id = 0 WHERE user_id = %s", (user_id,))
+            cursor.execute("""
+                UPDATE LeaderboardBest
+                SET quiz_id = NULL, attempt_id = NULL, score = NULL, knowledge_level = NULL, weakareas = NULL
+                WHERE user_id = %s
+            """, (user_id,))
+            cursor.execute("SELECT user_name FROM LeaderboardBest WHERE user_id = %s", (user_id,))
+            row = cursor.fetchone()
+            conn.commit()
+
+        if row:
+            self.leaderboard_index.update(self._empty_best(user_id, row[0]))
+
+    def clear_all_data(self):
+        with self.connection() as conn:
+            cursor = conn.cursor()
+
+            # Delete all quiz-related data first (respect FK constraints)
+            cursor.execute("DELETE FROM VideoTrack")
+            cursor.execute("DELETE FROM Question")
+            cursor.execute("DELETE FROM Quiz")
+
+            # Optional: Delete from VideoResources
+            # cursor.execute("DELETE FROM VideoResources")
+
+            # Delete users (last, due to FK)
+            cursor.execute("DELETE FROM LeaderboardBest")
+            cursor.execute("DELETE FROM users")
+            conn.commit()
+
+        self.leaderboard_index.clear()
+
+    # 🎬 Videos
+    def videos_for_weakareas(self, weakareas):
+        # Served from the in-memory catalog, reloaded when stale
+        if not weakareas:
+            return []
+        if self.video_catalog.needs_reload():
+            self.reload_videos()
+        return self.video_catalog.videos_for(weakareas)
+
+    def reload_videos(self):
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT video_id, weakarea, video_title, video_url, description FROM VideoResources")
+            rows = cursor.fetchall()
+        self.video_catalog.load(rows)
+
+    def watched_videos(self, user_id, quiz_id):
+        # Covered by uq_videotrack_user_quiz_video (user_id, quiz_id, video_id)
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT video_id, watched FROM VideoTrack
+                WHERE user_id = %s AND quiz_id = %s
+            """, (user_id, quiz_id))
+            return {row["video_id"]: row["watched"] for row in cursor.fetchall()}
+
+    def track_video(self, user_id, video_id, quiz_id, watched):
+        # One upsert on the (user_id, quiz_id, video_id) unique key
+        with self.connection() as conn:
+            conn.cursor().execute(self.backend.video_track_upsert, (user_id, video_id, quiz_id, watched))
+            conn.commit()
+
+    def video_history(self, user_id):
+        with self.connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT
+                    vt.quiz_id,
+                    vt.video_id,
+                    vr.weakarea,
+                    vr.video_title,
+                    vr.video_url,
+                    vr.description,
+                    vt.watched,
+                    vt.clicked_at
+                FROM VideoTrack vt
+                JOIN VideoResources vr ON vt.video_id = vr.video_id
+                WHERE vt.user_id = %s
+                ORDER BY vt.quiz_id DESC, vt.clicked_at DESC
+            """, (user_id,))
+            return cursor.fetchall()
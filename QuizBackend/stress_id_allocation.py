@@ -0,0 +1,114 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import Counter
+
+from storage import QuizRepository, SQLiteBackend, backend_from_env
+
+# Concurrency check for user and attempt id allocation. Many threads register
+# users (each name requested several times at once), then start quizzes and
+# submit retakes for the same users in parallel. From the repository root:
+#   python QuizBackend/stress_id_allocation.py --threads 16 --users 50 --attempts 20
+# against a fresh SQLite database, or --configured for the DB_BACKEND in .env
+# (it writes real rows there). Exits 1 if any name got two users or any user
+# got a duplicate or missing attempt id.
+
+
+def run_threads(count, target):
+    errors = []
+
+    def guarded(index):
+        try:
+            target(index)
+        except Exception as e:
+            errors.append(repr(e))
+
+    threads = [threading.Thread(target=guarded, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer register and retake to check id allocation.")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--users", type=int, default=50, help="distinct usernames")
+    parser.add_argument("--duplicates", type=int, default=4, help="concurrent registrations per username")
+    parser.add_argument("--attempts", type=int, default=20, help="quizzes started plus retakes per user")
+    parser.add_argument("--configured", action="store_true", help="use the backend configured in the environment")
+    args = parser.parse_args()
+
+    workdir = None
+    if args.configured:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        backend = backend_from_env()
+    else:
+        workdir = tempfile.mkdtemp(prefix="quiz-ids-")
+        backend = SQLiteBackend(os.path.join(workdir, "quiz.sqlite3"), size=args.threads, timeout=60)
+    repository = QuizRepository(backend, leaderboard_refresh=0)
+    prefix = f"stress-{os.getpid()}"
+
+    # Registrations: every name requested `duplicates` times, interleaved
+    requests = [f"{prefix}-{index % args.users}" for index in range(args.users * args.duplicates)]
+    created = []
+    lock = threading.Lock()
+
+    def register(worker):
+        for name in requests[worker::args.threads]:
+            user_id = repository.create_user(name, "not-a-real-hash")
+            if user_id is not None:
+                with lock:
+                    created.append((name, user_id))
+
+    errors = run_threads(args.threads, register)
+
+    # Attempts: start_quiz and record_retake alternate across threads
+    user_ids = [user_id for _, user_id in created]
+    jobs = [(user_id, attempt) for attempt in range(args.attempts) for user_id in user_ids]
+    attempts = []
+
+    def attempt(worker):
+        for user_id, number in jobs[worker::args.threads]:
+            if number % 2:
+                attempt_id = repository.record_retake(user_id, [("q", "a", 1, "area")], 100, 1.0, {})
+            else:
+                _, attempt_id = repository.start_quiz(user_id, 0.5, 0)
+            with lock:
+                attempts.append((user_id, attempt_id))
+
+    errors += run_threads(args.threads, attempt)
+
+    problems = [f"error: {error}" for error in errors[:10]]
+    names = Counter(name for name, _ in created)
+    problems += [f"{name} registered {count} times" for name, count in names.items() if count > 1]
+    if len(names) != args.users:
+        problems.append(f"{args.users - len(names)} names never registered")
+    if len(set(user_ids)) != len(user_ids):
+        problems.append("duplicate user ids")
+    per_user = {}
+    for user_id, attempt_id in attempts:
+        per_user.setdefault(user_id, []).append(attempt_id)
+    for user_id, ids in per_user.items():
+        if sorted(ids) != list(range(1, args.attempts + 1)):
+            problems.append(f"user {user_id} got attempt ids {sorted(ids)}")
+
+    print(f"{len(requests)} registrations -> {len(created)} users; {len(attempts)} attempts over {args.threads} threads")
+    if workdir is not None:
+        repository.pool.close_all()
+        shutil.rmtree(workdir, True)
+    for problem in problems[:20]:
+        print(problem)
+    if problems:
+        sys.exit(1)
+    print("Ids unique and consecutive")
+
+
+if __name__ == "__main__":
+    main()
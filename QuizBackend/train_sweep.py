@@ -0,0 +1,285 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Hyperparameter sweep for the question-selection DQN. From the repository root:
+#   python QuizBackend/train_sweep.py --name lr-gamma --timesteps 20000 --workers 4
+# Every combination of the search space (or --samples N random ones) is a
+# trial, trained in its own process. A trial checkpoints its model and replay
+# buffer every --checkpoint-every steps and records result.json when done, so
+# re-running the same command resumes: finished trials are skipped and
+# interrupted ones continue from their last checkpoint (the simulated
+# learners restart, the model and replay buffer do not). Trials are scored by
+# mean episode reward on a fixed-seed evaluation env; the best model is
+# copied to data/quiz_model.zip, with the fingerprint of the bank it was
+# trained on, where a running API server picks it up.
+#
+# The raw questions are preprocessed into the sweep directory once, when the
+# sweep starts, and every trial (resumed ones included) trains on that
+# export. The live CSV and .qbank the server maps are not touched until
+# promotion, which publishes the sweep's bank together with the model (see
+# promote), so the server never pairs a model with a bank it was not trained on.
+#
+# Layout: data/sweeps/<name>/sweep.json (settings and trial list),
+#         data/sweeps/<name>/{preprocessed_dataset.csv, question_bank.qbank},
+#         data/sweeps/<name>/trial-NNN/{checkpoint.zip, replay_buffer.pkl, model.zip, model.bank.json, result.json},
+#         data/sweeps/<name>/summary.json
+
+SWEEPS_DIR = os.path.join("QuizBackend", "data", "sweeps")
+MODEL_PATH = os.path.join("QuizBackend", "data", "quiz_model.zip")
+CSV_PATH = os.path.join("QuizBackend", "data", "preprocessed_dataset.csv")
+BANK_PATH = os.path.join("QuizBackend", "data", "question_bank.qbank")
+
+# Values tried per DQN argument; --space takes a JSON file of the same shape
+DEFAULT_SPACE = {
+    "learning_rate": [1e-4, 5e-4, 1e-3],
+    "gamma": [0.9, 0.99],
+    "exploration_fraction": [0.1, 0.3],
+}
+DEFAULT_CHECKPOINT_EVERY = 2000
+EVAL_EPISODES = 32
+EVAL_SEED = 12345
+
+
+def trial_grid(space, samples=None, seed=0):
+    names = sorted(space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+    if samples is not None and samples < len(grid):
+        grid = random.Random(seed).sample(grid, samples)
+    return grid
+
+
+def _write_json(path, data):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def _read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _checkpoint_callback(trial_dir, every):
+    from stable_baselines3.common.callbacks import BaseCallback
+
+    class Checkpoint(BaseCallback):
+        # Keeps one latest checkpoint, replaced atomically so a crash mid-save
+        # leaves the previous one intact
+        def _init_callback(self):
+            self.last_saved = self.num_timesteps
+
+        def _on_step(self):
+            if self.num_timesteps - self.last_saved >= every:
+                self.model.save(os.path.join(trial_dir, "checkpoint.tmp.zip"))
+                self.model.save_replay_buffer(os.path.join(trial_dir, "replay_buffer.tmp.pkl"))
+                os.replace(os.path.join(trial_dir, "replay_buffer.tmp.pkl"), os.path.join(trial_dir, "replay_buffer.pkl"))
+                os.replace(os.path.join(trial_dir, "checkpoint.tmp.zip"), os.path.join(trial_dir, "checkpoint.zip"))
+                self.last_saved = self.num_timesteps
+            return True
+
+    return Checkpoint()
+
+
+def run_trial(spec):
+    # Runs in a pool worker. spec: trial dict from sweep.json plus the run settings
+    import torch
+    from stable_baselines3 import DQN
+    from stable_baselines3.common.evaluation import evaluate_policy
+
+    from model_registry import save_bank_fingerprint
+    from modelTrain import build_model
+    from question_bank import QuestionBank
+    from quiz_env import make_quiz_vec_env
+
+    # One core per trial; the pool supplies the parallelism
+    torch.set_num_threads(1)
+    trial_dir = spec["dir"]
+    os.makedirs(trial_dir, exist_ok=True)
+    dataset = spec["dataset"]
+
+    env = make_quiz_vec_env(dataset, n_envs=spec["n_envs"], mode="batched", seed=spec["seed"])
+    checkpoint = os.path.join(trial_dir, "checkpoint.zip")
+    if os.path.exists(checkpoint):
+        model = DQN.load(checkpoint, env=env, device="cpu")
+        replay_buffer = os.path.join(trial_dir, "replay_buffer.pkl")
+        if os.path.exists(replay_buffer):
+            model.load_replay_buffer(replay_buffer)
+    else:
+        model = build_model(env, spec["hyperparams"], seed=spec["seed"], verbose=0)
+    resumed_from = model.num_timesteps
+
+    remaining = spec["timesteps"] - resumed_from
+    started = time.perf_counter()
+    if remaining > 0:
+        model.learn(total_timesteps=remaining, reset_num_timesteps=resumed_from == 0,
+                    callback=_checkpoint_callback(trial_dir, spec["checkpoint_every"]))
+    seconds = time.perf_counter() - started
+    env.close()
+
+    eval_env = make_quiz_vec_env(dataset, n_envs=8, mode="batched", seed=EVAL_SEED)
+    mean_reward, std_reward = evaluate_policy(model, eval_env, n_eval_episodes=EVAL_EPISODES, deterministic=True)
+    eval_env.close()
+
+    model.save(os.path.join(trial_dir, "model.zip"))
+    save_bank_fingerprint(os.path.join(trial_dir, "model.zip"), QuestionBank.from_dataframe(dataset))
+    result = {
+        "trial": spec["trial"],
+        "hyperparams": spec["hyperparams"],
+        "timesteps": model.num_timesteps,
+        "resumed_from": resumed_from,
+        "train_seconds": round(seconds, 2),
+        "steps_per_second": round((model.num_timesteps - resumed_from) / seconds, 1) if seconds > 0 else None,
+        "mean_reward": round(float(mean_reward), 4),
+        "std_reward": round(float(std_reward), 4),
+    }
+    _write_json(os.path.join(trial_dir, "result.json"), result)
+    # The finished model supersedes the checkpoint
+    for name in ("checkpoint.zip", "replay_buffer.pkl"):
+        if os.path.exists(os.path.join(trial_dir, name)):
+            os.remove(os.path.join(trial_dir, name))
+    return result
+
+
+def prepare_sweep(sweep_dir, settings):
+    # sweep.json fixes the trial list; resuming with other settings is refused
+    path = os.path.join(sweep_dir, "sweep.json")
+    if os.path.exists(path):
+        existing = _read_json(path)
+        if existing["settings"] != settings:
+            raise SystemExit(f"{sweep_dir} was started with different settings; resume it unchanged or pick a new --name")
+        return existing["trials"]
+
+    trials = [{"trial": index, "hyperparams": hyperparams, "seed": settings["seed"] + index}
+              for index, hyperparams in enumerate(trial_grid(settings["space"], settings["samples"], settings["seed"]))]
+    os.makedirs(sweep_dir, exist_ok=True)
+    _write_json(path, {"settings": settings, "trials": trials})
+    return trials
+
+
+def print_summary(results):
+    print(f"{'trial':<7}{'steps':>8}{'steps/s':>10}{'reward':>10}  hyperparams")
+    for result in sorted(results, key=lambda result: -result["mean_reward"]):
+        params = ", ".join(f"{name}={value}" for name, value in sorted(result["hyperparams"].items()))
+        print(f"{result['trial']:<7}{result['timesteps']:>8}{result['steps_per_second'] or 0:>10.0f}"
+              f"{result['mean_reward']:>10.3f}  {params}")
+
+
+def sweep_dataset(sweep_dir):
+    # The sweep's own export, made on first use (the bank is renamed into
+    # place before the CSV, so an existing CSV means both are complete)
+    import pandas as pd
+
+    from modelTrain import load_dataset
+
+    csv_path = os.path.join(sweep_dir, "preprocessed_dataset.csv")
+    if os.path.exists(csv_path):
+        return pd.read_csv(csv_path)
+    return load_dataset(csv_path, os.path.join(sweep_dir, "question_bank.qbank"))
+
+
+def _publish(source_path, target_path):
+    # Copied then renamed, so the model registry never loads a partial file
+    temp_path = f"{target_path}.tmp"
+    shutil.copyfile(source_path, temp_path)
+    os.replace(temp_path, target_path)
+
+
+def promote(result, sweep_dir, model_path=MODEL_PATH, csv_path=CSV_PATH, bank_path=BANK_PATH):
+    # Publishes the model, its bank fingerprint and, when the live bank
+    # differs, the sweep's bank. While the files are being replaced the
+    # registry sees a model whose fingerprint does not match the bank and
+    # serves the heuristic policy, never a mismatched model.
+    from model_registry import bank_fingerprint_path, load_question_bank, read_bank_fingerprint
+
+    source = os.path.join(sweep_dir, f"trial-{result['trial']:03d}", "model.zip")
+    _publish(bank_fingerprint_path(source), bank_fingerprint_path(model_path))
+    _publish(source, model_path)
+
+    live = load_question_bank(bank_path).fingerprint() if os.path.exists(bank_path) else None
+    if live != read_bank_fingerprint(source):
+        # Same order as preprocess: bank, CSV, then the bank stamped newer so
+        # the registry does not rebuild it from the CSV
+        _publish(os.path.join(sweep_dir, "question_bank.qbank"), bank_path)
+        _publish(os.path.join(sweep_dir, "preprocessed_dataset.csv"), csv_path)
+        os.utime(bank_path)
+        print(f"✅ Sweep question bank published to {bank_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel DQN hyperparameter sweep with checkpoint/resume.")
+    parser.add_argument("--name", default="default", help="sweep directory under data/sweeps; reuse it to resume")
+    parser.add_argument("--space", help="JSON file mapping DQN arguments to lists of values")
+    parser.add_argument("--samples", type=int, help="random subset of the grid to run")
+    parser.add_argument("--timesteps", type=int, default=10000, help="training steps per trial")
+    parser.add_argument("--n-envs", type=int, default=8, help="batched learners per trial")
+    parser.add_argument("--checkpoint-every", type=int, default=DEFAULT_CHECKPOINT_EVERY)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-promote", action="store_true", help="leave data/quiz_model.zip alone")
+    args = parser.parse_args()
+
+    space = DEFAULT_SPACE
+    if args.space:
+        space = _read_json(args.space)
+    settings = {"space": space, "samples": args.samples, "timesteps": args.timesteps,
+                "n_envs": args.n_envs, "seed": args.seed}
+    sweep_dir = os.path.join(SWEEPS_DIR, args.name)
+    trials = prepare_sweep(sweep_dir, settings)
+
+    results = []
+    pending = []
+    for trial in trials:
+        trial_dir = os.path.join(sweep_dir, f"trial-{trial['trial']:03d}")
+        result_path = os.path.join(trial_dir, "result.json")
+        if os.path.exists(result_path):
+            results.append(_read_json(result_path))
+        else:
+            pending.append({**trial, "dir": trial_dir, "timesteps": args.timesteps,
+                            "n_envs": args.n_envs, "checkpoint_every": args.checkpoint_every})
+    if pending:
+        dataset = sweep_dataset(sweep_dir)
+        for spec in pending:
+            spec["dataset"] = dataset
+    print(f"🚀 Sweep {args.name}: {len(trials)} trials, {len(results)} already done, "
+          f"{len(pending)} to run on {args.workers} workers")
+
+    failed = 0
+    # Spawned, not forked: workers load torch themselves instead of
+    # inheriting the parent's interpreter state
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(run_trial, spec): spec for spec in pending}
+        for future in as_completed(futures):
+            spec = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"❌ Trial {spec['trial']} failed: {e!r} (re-run to resume it)")
+                continue
+            results.append(result)
+            print(f"✅ Trial {result['trial']}: reward {result['mean_reward']:.3f}, "
+                  f"{result['steps_per_second'] or 0:.0f} steps/s")
+
+    if not results:
+        return
+    print_summary(results)
+    best = max(results, key=lambda result: result["mean_reward"])
+    _write_json(os.path.join(sweep_dir, "summary.json"), {"best": best, "results": sorted(results, key=lambda r: r["trial"])})
+    if failed:
+        print(f"{failed} trials failed; the best model is not promoted until all finish")
+    elif not args.no_promote:
+        promote(best, sweep_dir)
+        print(f"✅ Trial {best['trial']} promoted to {MODEL_PATH}")
+
+
+# Pool workers re-import this module, so nothing may run at import time
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import threading
+import time
+
+# In-memory weak-area -> videos map behind /api/weak_areas and
+# /api/weak_areas_latest. VideoResources is reference data that changes only
+# when content is edited, so the whole table is loaded at startup and again
+# after `refresh_interval` seconds (0 keeps it until invalidated) or after an
+# explicit invalidate(), e.g. from POST /api/admin/videos/reload.
+
+COLUMNS = ("video_id", "weakarea", "video_title", "video_url", "description")
+
+
+class VideoCatalog:
+    def __init__(self, refresh_interval=300.0):
+        self.refresh_interval = refresh_interval
+        self._by_weakarea = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self.loaded_at = None
+
+    def needs_reload(self):
+        if self.loaded_at is None:
+            return True
+        return self.refresh_interval > 0 and time.monotonic() - self.loaded_at > self.refresh_interval
+
+    def load(self, rows):
+        by_weakarea = {}
+        for row in sorted(rows, key=lambda row: row["video_id"]):
+            by_weakarea.setdefault(row["weakarea"], []).append({column: row[column] for column in COLUMNS})
+        with self._lock:
+            self._by_weakarea = by_weakarea
+            self._count = len(rows)
+            self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self.loaded_at = None
+
+    def videos_for(self, weakareas):
+        # Rows in video_id order, like the IN (...) query this replaces
+        with self._lock:
+            by_weakarea = self._by_weakarea
+        videos = [video for weakarea in set(weakareas) for video in by_weakarea.get(weakarea, ())]
+        return sorted(videos, key=lambda video: video["video_id"])
+
+    def stats(self):
+        with self._lock:
+            age = None if self.loaded_at is None else round(time.monotonic() - self.loaded_at, 1)
+            return {"videos": self._count, "weakareas": len(self._by_weakarea), "age_seconds": age}
+
+    def __len__(self):
+        return self._count
@@ -0,0 +1,135 @@
+import queue
+import threading
+import time
+
+# Write-behind buffer for per-answer persistence (WRITE_BEHIND=1).
+# Routes acknowledge from session state and submit() the DB write here; a
+# background worker hands batches to `flush_fn` in submission order.
+#   - bounded: at most `max_pending` writes wait, plus the batch being written
+#   - back-pressure: submit() blocks up to `put_timeout` seconds when full,
+#     then raises queue.Full so the route can ask the client to retry
+#   - flush() waits for the writes submitted before it (a sequence
+#     watermark), not for the queue to empty, so a steady stream of new
+#     writes cannot hold a reader up
+#   - close() (registered at exit) drains everything still queued
+
+DEFAULT_MAX_PENDING = 1000
+DEFAULT_BATCH_SIZE = 100
+# Seconds the worker waits for more writes to join a batch
+DEFAULT_FLUSH_INTERVAL = 0.05
+DEFAULT_PUT_TIMEOUT = 2.0
+DEFAULT_FLUSH_TIMEOUT = 5.0
+FLUSH_RETRIES = 3
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush_fn, max_pending=DEFAULT_MAX_PENDING, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, put_timeout=DEFAULT_PUT_TIMEOUT,
+                 flush_timeout=DEFAULT_FLUSH_TIMEOUT):
+        self._flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.flush_timeout = flush_timeout
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stopping = threading.Event()
+        # Writes accepted / written or dropped so far. The queue is FIFO and
+        # _submit_lock keeps puts in counting order, so when completed reaches
+        # the submitted count seen by flush(), every write before it is done.
+        self._submit_lock = threading.Lock()
+        self._progress = threading.Condition()
+        self.submitted = 0
+        self.completed = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        if self._stopping.is_set():
+            raise RuntimeError("Write-behind buffer is closed")
+        deadline = time.monotonic() + self.put_timeout
+        if not self._submit_lock.acquire(timeout=self.put_timeout):
+            raise queue.Full
+        try:
+            self._queue.put(item, timeout=max(0.0, deadline - time.monotonic()))
+            with self._progress:
+                self.submitted += 1
+        finally:
+            self._submit_lock.release()
+
+    def flush(self, timeout=None):
+        # Block until every write submitted before this call has been handed
+        # to flush_fn (written, or dropped after its retries). Returns False
+        # if that takes longer than `timeout` (default flush_timeout) seconds.
+        with self._progress:
+            target = self.submitted
+            return self._progress.wait_for(lambda: self.completed >= target,
+                                           self.flush_timeout if timeout is None else timeout)
+
+    def close(self, timeout=10.0):
+        self._stopping.set()
+        self._thread.join(timeout)
+        # Anything the worker did not get to is written here
+        batch = self._drain(self.batch_size)
+        while batch:
+            self._write(batch)
+            batch = self._drain(self.batch_size)
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize(),
+            "submitted": self.submitted,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._write(batch)
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            for attempt in range(FLUSH_RETRIES + 1):
+                try:
+                    self._flush_fn(batch)
+                    self.flushed += len(batch)
+                    self.batches += 1
+                    return
+                except Exception as e:
+                    print("Write-behind flush failed:", e)
+                    if attempt < FLUSH_RETRIES:
+                        time.sleep(min(0.1 * 2 ** attempt, 2.0))
+            self.dropped += len(batch)
+            print(f"Write-behind dropped {len(batch)} writes after {FLUSH_RETRIES} retries")
+        finally:
+            with self._progress:
+                self.completed += len(batch)
+                self._progress.notify_all()